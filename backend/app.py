@@ -2,35 +2,99 @@ import io
 import os
 import hashlib
 import zipfile
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import base64
 import json
-import requests
 
 from flask import Flask, request, jsonify, send_file, render_template_string, redirect
 from flask_cors import CORS
-from sqlalchemy import create_engine, Column, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, text, select, and_, or_
 from sqlalchemy.orm import declarative_base, sessionmaker
-import pandas as pd
-import qrcode # type: ignore # type: ignore
-from PIL import Image, ImageDraw, ImageFont
-import tempfile
+import numpy as np
+from PIL import Image, ImageDraw
 import hmac
+import tempfile
+import threading
+import time
+from functools import lru_cache, wraps
 
 try:
     # When running as a package (python -m backend.app)
-    from .stego_lsb import embed_message, extract_message
+    from .stego_lsb import DEFAULT_REDUNDANCY, plan_embedding, apply_embedding_to_rows
+    from .png_stream import StreamingPNGWriter
+    from .revocation import RevocationIndex
+    from .signed_token import TokenSigner, token_length, unverified_cert_hash
+    from .robust_extract import decode_verify_qr, extract_certificate_payload
+    from .render_cache import RenderCache
+    from .border_assets import BorderAssetRegistry, DEFAULT_CACHE_DIR
+    from .text_layout import load_font, layout_text, wrap_text
 except Exception:
     # When running as a script from the backend directory (python app.py)
-    from stego_lsb import embed_message, extract_message
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader # type: ignore
-from reportlab.pdfgen import canvas # type: ignore
-
+    from stego_lsb import DEFAULT_REDUNDANCY, plan_embedding, apply_embedding_to_rows
+    from png_stream import StreamingPNGWriter
+    from revocation import RevocationIndex
+    from signed_token import TokenSigner, token_length, unverified_cert_hash
+    from robust_extract import decode_verify_qr, extract_certificate_payload
+    from render_cache import RenderCache
+    from border_assets import BorderAssetRegistry, DEFAULT_CACHE_DIR
+    from text_layout import load_font, layout_text, wrap_text
+
+# Heavy dependencies (pandas, reportlab, qrcode, requests) are imported on first
+# use so that importing this module, spawning a worker or answering /health stays cheap.
 
 # Configuration
 PUBLIC_VERIFY_BASE = os.environ.get('PUBLIC_VERIFY_BASE', 'http://127.0.0.1:5000/verify')
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///certificates.db')
+# When set, stego payloads are scattered over the image with a keyed permutation
+# instead of being written in raster order from the top-left pixel.
+STEGO_KEY = os.environ.get('STEGO_KEY') or None
+STEGO_REDUNDANCY = int(os.environ.get('STEGO_REDUNDANCY', str(DEFAULT_REDUNDANCY)))
+
+# Render admission control: at most RENDER_CONCURRENCY renders run at once per
+# worker process, RENDER_QUEUE_SIZE more may wait up to RENDER_QUEUE_TIMEOUT
+# seconds; anything beyond that is turned away so /verify and /health stay responsive.
+# gunicorn.conf.py runs one worker per core, so one render per worker keeps the
+# host at one CPU-bound render per core.
+# Both are capped so that RENDER_RESERVED_THREADS of the worker's request threads
+# (GUNICORN_THREADS, also read by gunicorn.conf.py) never wait on a render.
+WORKER_THREADS = max(1, int(os.environ.get('GUNICORN_THREADS', '8')))
+RENDER_RESERVED_THREADS = max(1, int(os.environ.get('RENDER_RESERVED_THREADS', str(WORKER_THREADS // 2))))
+_RENDER_THREADS = max(1, WORKER_THREADS - RENDER_RESERVED_THREADS)
+RENDER_CONCURRENCY = min(_RENDER_THREADS, max(1, int(os.environ.get('RENDER_CONCURRENCY', '1'))))
+RENDER_QUEUE_SIZE = min(_RENDER_THREADS - RENDER_CONCURRENCY,
+                        max(0, int(os.environ.get('RENDER_QUEUE_SIZE', str(_RENDER_THREADS)))))
+RENDER_QUEUE_TIMEOUT = float(os.environ.get('RENDER_QUEUE_TIMEOUT', '30'))
+RENDER_RETRY_AFTER = int(os.environ.get('RENDER_RETRY_AFTER', '5'))
+# Bundled borders (build/borders, public/borders) are decoded into raw RGBA files
+# here once and memory-mapped by every worker
+BORDER_CACHE_DIR = os.environ.get('BORDER_CACHE_DIR') or DEFAULT_CACHE_DIR
+# Origins (besides PUBLIC_VERIFY_BASE's) whose /borders/<file> URLs are the bundled
+# borders, e.g. the frontend's when it is served from a different host
+BORDER_ASSET_ORIGINS = [u.strip() for u in os.environ.get('BORDER_ASSET_ORIGINS', '').split(',') if u.strip()]
+# Import pandas/reportlab/qrcode/requests during worker warm-up instead of on first
+# use; trades slower worker boot for a faster first render
+WARM_HEAVY_IMPORTS = os.environ.get('WARM_HEAVY_IMPORTS', '0') in ('1', 'true', 'yes')
+# Comma-separated border URLs fetched into the border cache when a worker starts
+WARM_BORDER_URLS = [u.strip() for u in os.environ.get('WARM_BORDER_URLS', '').split(',') if u.strip()]
+# Use an SQLite FTS5 index for recipient name search when available
+ENABLE_FTS = os.environ.get('ENABLE_FTS', '1') not in ('0', 'false', 'no')
+# Bearer token required by admin endpoints (listing, revocation); they are disabled without it
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+# How often each worker pulls new revocations into its in-memory filter
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('REVOCATION_REFRESH_SECONDS', '5'))
+# When set, QR codes and stego payloads carry an HMAC-signed token that can be
+# verified without a database lookup
+TOKEN_SIGNING_KEY = os.environ.get('TOKEN_SIGNING_KEY') or None
+token_signer = TokenSigner(TOKEN_SIGNING_KEY.encode('utf-8')) if TOKEN_SIGNING_KEY else None
+# Cache of final /generate_png output keyed by the normalized request; RENDER_CACHE_DIR
+# adds a disk tier (which worker processes can share)
+RENDER_CACHE_ITEMS = int(os.environ.get('RENDER_CACHE_ITEMS', '256'))
+RENDER_CACHE_BYTES = int(os.environ.get('RENDER_CACHE_BYTES', str(128 * 1024 * 1024)))
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR') or None
+RENDER_CACHE_DISK_BYTES = int(os.environ.get('RENDER_CACHE_DISK_BYTES', str(1024 * 1024 * 1024)))
+# Layout coordinates are CSS pixels; print renders scale them by dpi / REFERENCE_DPI
+REFERENCE_DPI = 96.0
+MAX_RENDER_SCALE = float(os.environ.get('MAX_RENDER_SCALE', '8'))
 
 app = Flask(__name__)
 # Allow frontend to call API from any origin (adjust to your domain in production)
@@ -39,7 +103,8 @@ CORS(
     resources={r"/*": {"origins": "*"}},
     methods=["GET", "POST", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "ETag", "X-Cache", "X-Duplicate-Rows",
+                    "X-Conflicting-Certificates", "X-Existing-Certificates"],
 )
 
 # Increase maximum request size to handle large files and data
@@ -48,8 +113,26 @@ app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB limit
 
 # Database setup
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+SessionLocal = sessionmaker(autoflush=False, autocommit=False)
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Create the engine on first use and bind ``SessionLocal`` to it."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+                _engine = create_engine(DATABASE_URL, echo=False, future=True)
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def get_session():
+    get_engine()
+    return SessionLocal()
 
 
 class Certificate(Base):
@@ -64,8 +147,106 @@ class Certificate(Base):
     certificate_description = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Serves both created_at range filters and the keyset order of /certificates
+        Index('ix_certificates_created_at_hash', 'created_at', 'cert_hash'),
+        # Exact-match filters followed by the keyset order, so a low-selectivity
+        # filter (e.g. one large organization) reads rows in order without sorting
+        Index('ix_certificates_recipient_created', 'recipient_name', 'created_at', 'cert_hash'),
+        Index('ix_certificates_course_created', 'course_name', 'created_at', 'cert_hash'),
+        Index('ix_certificates_org_created', 'issuing_organization', 'created_at', 'cert_hash'),
+    )
+
+
+class Revocation(Base):
+    __tablename__ = 'revocations'
+
+    # Monotonic id lets workers pull only revocations they have not seen yet. SQLite
+    # needs AUTOINCREMENT for that: without it a deleted (un-revoked) max id is reused.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cert_hash = Column(String(64), nullable=False, unique=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    reason = Column(Text, nullable=True)
+
+
+# FTS5 index over recipient names. certificates has a text primary key, and
+# SQLite may renumber such a table's implicit rowids on VACUUM, so FTS rows are
+# keyed by certificates_fts_ids.id (an INTEGER PRIMARY KEY, which VACUUM keeps)
+# instead. Triggers keep both tables in sync.
+_FTS_DDL = [
+    "CREATE TABLE IF NOT EXISTS certificates_fts_ids ("
+    "id INTEGER PRIMARY KEY, cert_hash VARCHAR(64) NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS certificates_name_fts USING fts5(recipient_name)",
+    "CREATE TRIGGER IF NOT EXISTS certificates_name_fts_ai AFTER INSERT ON certificates BEGIN "
+    "INSERT INTO certificates_fts_ids(cert_hash) VALUES (new.cert_hash); "
+    "INSERT INTO certificates_name_fts(rowid, recipient_name) "
+    "VALUES ((SELECT id FROM certificates_fts_ids WHERE cert_hash = new.cert_hash), new.recipient_name); END",
+    "CREATE TRIGGER IF NOT EXISTS certificates_name_fts_ad AFTER DELETE ON certificates BEGIN "
+    "DELETE FROM certificates_name_fts "
+    "WHERE rowid = (SELECT id FROM certificates_fts_ids WHERE cert_hash = old.cert_hash); "
+    "DELETE FROM certificates_fts_ids WHERE cert_hash = old.cert_hash; END",
+    "CREATE TRIGGER IF NOT EXISTS certificates_name_fts_au AFTER UPDATE OF recipient_name ON certificates BEGIN "
+    "UPDATE certificates_name_fts SET recipient_name = new.recipient_name "
+    "WHERE rowid = (SELECT id FROM certificates_fts_ids WHERE cert_hash = new.cert_hash); END",
+]
+_fts_enabled = False
 
-Base.metadata.create_all(bind=engine)
+
+def _init_fts(engine) -> bool:
+    if not ENABLE_FTS or engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with engine.begin() as conn:
+            created = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='certificates_name_fts'"
+            )).first() is None
+            for ddl in _FTS_DDL:
+                conn.execute(text(ddl))
+            if created:
+                # Index rows that predate the FTS table
+                conn.execute(text(
+                    "INSERT OR IGNORE INTO certificates_fts_ids(cert_hash) SELECT cert_hash FROM certificates"
+                ))
+                conn.execute(text(
+                    "INSERT INTO certificates_name_fts(rowid, recipient_name) SELECT i.id, c.recipient_name "
+                    "FROM certificates c JOIN certificates_fts_ids i ON i.cert_hash = c.cert_hash"
+                ))
+        return True
+    except Exception as e:
+        # SQLite builds without FTS5 fall back to LIKE search
+        print(f"FTS5 unavailable, using LIKE for name search: {e}")
+        return False
+
+
+def init_db() -> None:
+    """Create missing tables and indexes. Run once at startup, not on import.
+
+    Concurrent callers race on DDL, so multi-process servers run this once in the
+    parent process (see gunicorn.conf.py) and start workers with SKIP_INIT_DB=1.
+    """
+    global _fts_enabled
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist
+    for index in Certificate.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    _fts_enabled = _init_fts(engine)
+
+
+def _detect_fts(engine) -> bool:
+    """Whether the FTS index created by :func:`init_db` exists (read-only)."""
+    if not ENABLE_FTS or engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='certificates_name_fts'"
+            )).first() is not None
+    except Exception as e:
+        print(f"FTS detection failed, using LIKE for name search: {e}")
+        return False
 
 
 REQUIRED_COLUMNS = [
@@ -91,6 +272,8 @@ def normalize_username(raw: str) -> str:
 
 
 def generate_qr_image(verification_url: str):
+    import qrcode  # type: ignore
+
     qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M,
                        box_size=8, border=2)
     qr.add_data(verification_url)
@@ -120,7 +303,22 @@ def _scale_position(x: float, y: float, ref_width: float, ref_height: float, tar
         return x, y
 
 
+# Fields that may wrap onto several lines unless the layout sets maxLines; the
+# others shrink to stay on one line within boxWidth
+_DEFAULT_MAX_LINES = {'paragraph': 4}
+
+
+def _layout_element_text(el_key: str, el: dict, text: str, font_size: int, bold: bool, box_width: float):
+    max_lines = el.get('maxLines')
+    if not isinstance(max_lines, int) or max_lines < 1:
+        max_lines = _DEFAULT_MAX_LINES.get(el_key, 1)
+    return layout_text(text, bold, font_size, box_width, max_lines=max_lines)
+
+
 def build_certificate_pdf_bytes(data: dict, qr_img, layout: dict | None = None) -> bytes:
+    from reportlab.lib.utils import ImageReader  # type: ignore
+    from reportlab.pdfgen import canvas  # type: ignore
+
     # Prepare PDF in memory
     buffer = io.BytesIO()
 
@@ -152,13 +350,15 @@ def build_certificate_pdf_bytes(data: dict, qr_img, layout: dict | None = None)
             except Exception:
                 pass
         else:
-            border_url = layout.get('borderImageUrlAbsolute') or layout.get('borderImageUrl')
+            border_url = _border_source(layout)
             if border_url:
                 try:
-                    resp = requests.get(border_url, timeout=10)
-                    if resp.ok:
-                        img_reader = ImageReader(io.BytesIO(resp.content))
-                        c.drawImage(img_reader, 0, 0, width, height, mask='auto')
+                    border_id = border_assets.resolve(border_url)
+                    if border_id is not None:
+                        img_reader = ImageReader(border_assets.path(border_id))
+                    else:
+                        img_reader = ImageReader(io.BytesIO(_fetch_border_bytes(border_url)))
+                    c.drawImage(img_reader, 0, 0, width, height, mask='auto')
                 except Exception:
                     pass
 
@@ -194,8 +394,11 @@ def build_certificate_pdf_bytes(data: dict, qr_img, layout: dict | None = None)
                 r, g, b = 0, 0, 0
 
             c.setFillColorRGB(r, g, b)
-            safe_font = "Helvetica-Bold" if str(font_weight).lower() == 'bold' or str(font_weight) == '700' else "Helvetica"
-            c.setFont(safe_font, font_size)
+            bold = str(font_weight).lower() == 'bold' or str(font_weight) == '700'
+            safe_font = "Helvetica-Bold" if bold else "Helvetica"
+            # Shared layout so the PDF breaks lines exactly where the PNG does
+            block = _layout_element_text(el_key, el, text, font_size, bold, float(box_width))
+            c.setFont(safe_font, block.size)
 
             # Get position from element (left/top anchor in preview coordinates)
             px = float(pos.get('x', 80))
@@ -226,12 +429,15 @@ def build_certificate_pdf_bytes(data: dict, qr_img, layout: dict | None = None)
             anchor_x = max(min(anchor_x, width - 10), 10)
 
             # Draw text using appropriate alignment function
-            if draw_fn == 'center':
-                c.drawCentredString(anchor_x, py_final, text)
-            elif draw_fn == 'right':
-                c.drawRightString(anchor_x, py_final, text)
-            else:
-                c.drawString(anchor_x, py_final, text)
+            line_step = block.line_height / ref_h * height
+            for i, line in enumerate(block.lines):
+                line_y = py_final - i * line_step
+                if draw_fn == 'center':
+                    c.drawCentredString(anchor_x, line_y, line)
+                elif draw_fn == 'right':
+                    c.drawRightString(anchor_x, line_y, line)
+                else:
+                    c.drawString(anchor_x, line_y, line)
 
         draw_text('title', data.get('Certificate Title') or 'Certificate of Completion', ("Helvetica-Bold", 22))
         draw_text('intro', 'This is to certify that', ("Helvetica", 14))
@@ -276,18 +482,7 @@ def build_certificate_pdf_bytes(data: dict, qr_img, layout: dict | None = None)
         c.drawString(80, height - 200, f"Date: {data.get('Certificate Date')}")
         c.drawString(80, height - 220, f"Issued by: {data.get('Issuing Organization')}")
         desc = data.get('Certificate Description') or ''
-        max_width = width - 160
-        lines = []
-        current = ''
-        for word in desc.split():
-            trial = (current + ' ' + word).strip()
-            if c.stringWidth(trial, "Helvetica", 12) <= max_width:
-                current = trial
-            else:
-                lines.append(current)
-                current = word
-        if current:
-            lines.append(current)
+        lines = wrap_text(desc, False, 12, width - 160).lines
         y = height - 260
         for line in lines[:8]:
             c.drawString(80, y, line)
@@ -315,33 +510,66 @@ def build_certificate_pdf_bytes(data: dict, qr_img, layout: dict | None = None)
     return buffer.read()
 
 
-def _load_border_image_from_layout(layout: dict | None, width: int, height: int) -> Image.Image | None:
+border_assets = BorderAssetRegistry(cache_dir=BORDER_CACHE_DIR, origins=[PUBLIC_VERIFY_BASE, *BORDER_ASSET_ORIGINS])
+
+
+@lru_cache(maxsize=32)
+def _fetch_border_bytes(border_url: str) -> bytes:
+    # Raises on failure so that failed fetches are not cached
+    import requests
+
+    resp = requests.get(border_url, timeout=10)
+    resp.raise_for_status()
+    return resp.content
+
+
+def _border_source(layout: dict | None) -> str | None:
     if not layout:
         return None
     border_data_url = layout.get('borderImageDataUrl') or ''
     if isinstance(border_data_url, str) and border_data_url.startswith('data:image'):
-        try:
-            header, b64 = border_data_url.split(',', 1)
-            img_bytes = io.BytesIO(base64.b64decode(b64))
-            img = Image.open(img_bytes).convert('RGBA')
-            return img.resize((width, height), Image.LANCZOS)
-        except Exception:
-            pass
+        return border_data_url
+    # The editor sends both forms; a relative bundled path needs no trusted origin
+    relative = layout.get('borderImageUrl')
+    if isinstance(relative, str) and border_assets.resolve(relative) is not None:
+        return relative
+    return layout.get('borderImageUrlAbsolute') or relative or None
+
+
+@lru_cache(maxsize=8)
+def _decoded_border(source: str) -> Image.Image:
+    border_id = border_assets.resolve(source)
+    if border_id is not None:
+        return border_assets.image(border_id)
+    if source.startswith('data:image'):
+        header, b64 = source.split(',', 1)
+        raw = base64.b64decode(b64)
     else:
-        border_url = layout.get('borderImageUrlAbsolute') or layout.get('borderImageUrl')
-        if border_url:
-            try:
-                resp = requests.get(border_url, timeout=10)
-                if resp.ok:
-                    img = Image.open(io.BytesIO(resp.content)).convert('RGBA')
-                    return img.resize((width, height), Image.LANCZOS)
-            except Exception:
-                pass
-    return None
+        raw = _fetch_border_bytes(source)
+    img = Image.open(io.BytesIO(raw)).convert('RGBA')
+    img.load()
+    return img
 
 
-def build_certificate_png_bytes(data: dict, qr_img, layout: dict | None = None) -> bytes:
-    # Determine reference dimensions
+@lru_cache(maxsize=32)
+def _resized_border(source: str, width: int, height: int, resample: int) -> Image.Image:
+    # Cached images are shared between requests and must not be modified in place
+    return _decoded_border(source).resize((width, height), resample)
+
+
+def _load_border_image_from_layout(layout: dict | None, width: int, height: int,
+                                   resample: int = Image.LANCZOS) -> tuple[Image.Image | None, bool]:
+    """Return ``(border, ok)``; ``ok`` is False when the layout has a border that could not be loaded."""
+    source = _border_source(layout)
+    if not source:
+        return None, True
+    try:
+        return _resized_border(source, width, height, resample), True
+    except Exception:
+        return None, False
+
+
+def _reference_size(layout: dict | None) -> tuple[int, int]:
     ref_w = 800
     ref_h = 600
     if layout:
@@ -351,38 +579,32 @@ def build_certificate_png_bytes(data: dict, qr_img, layout: dict | None = None)
             ref_h = int(float(ref_dims.get('height', 600)))
         except Exception:
             ref_w, ref_h = 800, 600
+    return ref_w, ref_h
 
-    width, height = ref_w, ref_h
 
-    # Base image (RGBA for compositing)
-    base = Image.new('RGBA', (width, height), (255, 255, 255, 255))
+def _certificate_display_list(data: dict, qr_img, layout: dict | None, scale: float,
+                              width: int, height: int) -> list[tuple]:
+    """Resolve the certificate into draw operations in output pixel coordinates.
 
-    # Background/border
-    bg = _load_border_image_from_layout(layout, width, height)
-    if bg is not None:
-        base.alpha_composite(bg)
+    Ops are ``('text', x, y, text, font, fill, top, bottom)`` and
+    ``('image', img, x, y)``; the border is handled separately by the caller.
+    """
+    ref_w, ref_h = _reference_size(layout)
+    ops: list[tuple] = []
 
-    draw = ImageDraw.Draw(base)
+    def _font(bold: bool, size: float):
+        return load_font(bold, max(1, round(size * scale)))
 
-    def _safe_font(bold: bool, size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
-        # Try common fonts; fall back to default bitmap font
-        candidates = [
-            ("arialbd.ttf" if bold else "arial.ttf", size),
-            ("DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf", size),
-        ]
-        for name, sz in candidates:
-            try:
-                return ImageFont.truetype(name, sz)
-            except Exception:
-                continue
-        return ImageFont.load_default()
+    def add_text(x: float, y: float, text: str, font, fill) -> None:
+        bbox = font.getbbox(text)
+        ops.append(('text', x, y, text, font, fill, y + bbox[1], y + bbox[3]))
 
     if layout:
         elements = layout.get('elements') or {}
 
         def draw_text(el_key: str, text: str, fallback=(False, 12)):
             el = elements.get(el_key) or {}
-            pos = el.get('position') or {'x': 80, 'y': height - 160}
+            pos = el.get('position') or {'x': 80, 'y': ref_h - 160}
             style = el.get('style') or {}
             font_size = int(str(style.get('fontSize', fallback[1])).replace('px', '')) if isinstance(style.get('fontSize'), (str, int)) else fallback[1]
             font_weight = str(style.get('fontWeight', 'normal')).lower()
@@ -407,29 +629,33 @@ def build_certificate_png_bytes(data: dict, qr_img, layout: dict | None = None)
                 color = (0, 0, 0, 255)
 
             bold = font_weight == 'bold' or font_weight == '700'
-            font = _safe_font(bold, font_size)
+            # Line breaks and size come from reference space so every scale (and the PDF) agrees
+            block = _layout_element_text(el_key, el, text, font_size, bold, float(box_width))
+            font = _font(bold, block.size)
 
             px = float(pos.get('x', 80))
             py = float(pos.get('y', 80))
             px_scaled = (px / ref_w) * width
             py_scaled = (py / ref_h) * height
-            py_final = py_scaled  # PIL uses top-left origin
+            line_step = block.line_height / ref_h * height
 
             container_width_scaled = (float(box_width) / ref_w) * width
 
-            # Compute text x based on alignment
-            text_w, _ = draw.textbbox((0, 0), text, font=font)[2:4]
-            if text_align == 'center':
-                anchor_x = px_scaled + (container_width_scaled / 2)
-                text_x = anchor_x - (text_w / 2)
-            elif text_align == 'right':
-                anchor_x = px_scaled + container_width_scaled
-                text_x = anchor_x - text_w
-            else:
-                text_x = px_scaled
+            for i, line in enumerate(block.lines):
+                # Compute text x based on alignment
+                text_w = font.getbbox(line)[2]
+                if text_align == 'center':
+                    anchor_x = px_scaled + (container_width_scaled / 2)
+                    text_x = anchor_x - (text_w / 2)
+                elif text_align == 'right':
+                    anchor_x = px_scaled + container_width_scaled
+                    text_x = anchor_x - text_w
+                else:
+                    text_x = px_scaled
 
-            text_x = max(min(text_x, width - 10), 10)
-            draw.text((text_x, py_final), text, fill=color, font=font)
+                text_x = max(min(text_x, width - 10 * scale), 10 * scale)
+                # PIL uses top-left origin
+                add_text(text_x, py_scaled + i * line_step, line, font, color)
 
         draw_text('title', data.get('Certificate Title') or 'Certificate of Completion', (True, 22))
         draw_text('intro', 'This is to certify that', (False, 14))
@@ -443,36 +669,139 @@ def build_certificate_png_bytes(data: dict, qr_img, layout: dict | None = None)
         qr_drawn = False
         qr_el = (elements.get('qr') or elements.get('QR') or elements.get('qrcode'))
         if qr_el:
-            qpos = qr_el.get('position') or {'x': width - 160, 'y': 60}
-            qx = float(qpos.get('x', width - 160))
+            qpos = qr_el.get('position') or {'x': ref_w - 160, 'y': 60}
+            qx = float(qpos.get('x', ref_w - 160))
             qy = float(qpos.get('y', 60))
             qx_scaled = int((qx / ref_w) * width)
             qy_scaled = int((qy / ref_h) * height)
             qr_size = int(qr_el.get('size') or 120)
-            qr_size_scaled = int((qr_size / ref_w) * width)
+            qr_size_scaled = max(1, int((qr_size / ref_w) * width))
 
-            qr_bytes = io.BytesIO()
-            qr_img.save(qr_bytes, format='PNG')
-            qr_bytes.seek(0)
-            qr_pil = Image.open(qr_bytes).convert('RGBA').resize((qr_size_scaled, qr_size_scaled), Image.NEAREST)
-            base.alpha_composite(qr_pil, dest=(qx_scaled, qy_scaled))
+            qr_pil = qr_img.convert('RGBA').resize((qr_size_scaled, qr_size_scaled), Image.NEAREST)
+            ops.append(('image', qr_pil, qx_scaled, qy_scaled))
             qr_drawn = True
         if not qr_drawn:
-            qr_size = 120
+            qr_size = max(1, round(120 * scale))
+            margin = round(40 * scale)
             qr_pil = qr_img.convert('RGBA').resize((qr_size, qr_size), Image.NEAREST)
-            base.alpha_composite(qr_pil, dest=(width - qr_size - 40, height - qr_size - 40))
+            ops.append(('image', qr_pil, width - qr_size - margin, height - qr_size - margin))
     else:
         # Simple default layout
-        title_font = _safe_font(True, 22)
-        body_font = _safe_font(False, 12)
-        draw.text((width / 2 - 180, 40), data.get('Certificate Title') or 'Certificate of Completion', fill=(0, 0, 0, 255), font=title_font)
-        draw.text((80, 100), f"Recipient: {data.get('Recipient Name')}", fill=(0, 0, 0, 255), font=body_font)
-        draw.text((80, 120), f"Course: {data.get('Course Name')}", fill=(0, 0, 0, 255), font=body_font)
-        draw.text((80, 140), f"Date: {data.get('Certificate Date')}", fill=(0, 0, 0, 255), font=body_font)
-        draw.text((80, 160), f"Issued by: {data.get('Issuing Organization')}", fill=(0, 0, 0, 255), font=body_font)
+        title_font = _font(True, 22)
+        body_font = _font(False, 12)
+        black = (0, 0, 0, 255)
+        add_text(width / 2 - 180 * scale, 40 * scale, data.get('Certificate Title') or 'Certificate of Completion', title_font, black)
+        add_text(80 * scale, 100 * scale, f"Recipient: {data.get('Recipient Name')}", body_font, black)
+        add_text(80 * scale, 120 * scale, f"Course: {data.get('Course Name')}", body_font, black)
+        add_text(80 * scale, 140 * scale, f"Date: {data.get('Certificate Date')}", body_font, black)
+        add_text(80 * scale, 160 * scale, f"Issued by: {data.get('Issuing Organization')}", body_font, black)
+
+        qr_size = max(1, round(120 * scale))
+        qr_pil = qr_img.convert('RGBA').resize((qr_size, qr_size), Image.NEAREST)
+        ops.append(('image', qr_pil, width - round(160 * scale), height - round(160 * scale)))
+
+    return ops
+
+
+def _draw_ops(canvas: Image.Image, ops: list[tuple], row_start: int) -> None:
+    """Draw ``ops`` onto ``canvas``, which holds output rows ``row_start`` onwards."""
+    draw = ImageDraw.Draw(canvas)
+    row_end = row_start + canvas.height
+    for op in ops:
+        if op[0] == 'text':
+            _, x, y, text, font, fill, top, bottom = op
+            if bottom < row_start or top >= row_end:
+                continue
+            draw.text((x, y - row_start), text, fill=fill, font=font)
+        else:
+            _, img, x, y = op
+            src_top = max(0, row_start - y)
+            src_bottom = min(img.height, row_end - y)
+            if src_top >= src_bottom:
+                continue
+            canvas.alpha_composite(img, dest=(x, y + src_top - row_start), source=(0, src_top, img.width, src_bottom))
+
+
+def _output_size(layout: dict | None, scale: float) -> tuple[int, int]:
+    ref_w, ref_h = _reference_size(layout)
+    return max(1, round(ref_w * scale)), max(1, round(ref_h * scale))
+
+
+def _draw_certificate(data: dict, qr_img, layout: dict | None, scale: float,
+                      resample: int) -> tuple[Image.Image, bool]:
+    # Returns the image and whether the layout's border (if any) made it in
+    width, height = _output_size(layout, scale)
+
+    # Base image (RGBA for compositing)
+    base = Image.new('RGBA', (width, height), (255, 255, 255, 255))
+
+    # Background/border
+    bg, border_ok = _load_border_image_from_layout(layout, width, height, resample)
+    if bg is not None:
+        base.alpha_composite(bg)
+
+    _draw_ops(base, _certificate_display_list(data, qr_img, layout, scale, width, height), 0)
+    return base, border_ok
+
+
+def render_certificate_image(data: dict, qr_img, layout: dict | None = None, scale: float = 1.0,
+                             resample: int = Image.LANCZOS) -> Image.Image:
+    """Draw the certificate as an RGBA image of ``referenceDimensions * scale``.
+
+    Layout coordinates, font sizes and the QR size stay in reference space and are
+    multiplied by ``scale``; ``resample`` is used for the border resize. A border
+    that cannot be loaded is left out.
+    """
+    return _draw_certificate(data, qr_img, layout, scale, resample)[0]
+
+
+def write_certificate_png_tiled(data: dict, qr_img, layout: dict | None, scale: float, fileobj,
+                                stego_message: str | None = None, dpi: float | None = None,
+                                strip_height: int = 256) -> bool:
+    """Render and PNG-encode the certificate in horizontal strips.
+
+    Used for print resolution: peak memory is one ``width x strip_height`` strip
+    plus the decoded border source, regardless of output height. The stego
+    payload, if given, is applied to each strip before it is encoded. Returns
+    False if the layout's border could not be loaded and was left out.
+    """
+    width, height = _output_size(layout, scale)
+    ops = _certificate_display_list(data, qr_img, layout, scale, width, height)
+
+    border = None
+    border_ok = True
+    source = _border_source(layout)
+    if source:
+        try:
+            border = _decoded_border(source)
+        except Exception:
+            border_ok = False
+
+    plan = None
+    if stego_message is not None:
+        plan = plan_embedding(stego_message, width, height, key=STEGO_KEY, redundancy=STEGO_REDUNDANCY)
+
+    writer = StreamingPNGWriter(fileobj, width, height, dpi=dpi)
+    for row_start in range(0, height, strip_height):
+        strip_h = min(strip_height, height - row_start)
+        strip = Image.new('RGBA', (width, strip_h), (255, 255, 255, 255))
+        if border is not None:
+            # Resize only the source band behind this strip; box keeps filter support across strip edges
+            sy = border.height / float(height)
+            band = border.resize((width, strip_h), Image.LANCZOS,
+                                 box=(0, row_start * sy, border.width, (row_start + strip_h) * sy))
+            strip.alpha_composite(band)
+        _draw_ops(strip, ops, row_start)
+        rows = np.asarray(strip.convert('RGB')).copy()
+        if plan is not None:
+            apply_embedding_to_rows(rows, row_start, *plan)
+        writer.write_rows(rows)
+    writer.close()
+    return border_ok
 
-        qr_pil = qr_img.convert('RGBA').resize((120, 120), Image.NEAREST)
-        base.alpha_composite(qr_pil, dest=(width - 160, height - 160))
+
+def build_certificate_png_bytes(data: dict, qr_img, layout: dict | None = None) -> bytes:
+    base = render_certificate_image(data, qr_img, layout)
 
     # Export to PNG bytes (without stego)
     out = io.BytesIO()
@@ -481,6 +810,264 @@ def build_certificate_png_bytes(data: dict, qr_img, layout: dict | None = None)
     return out.read()
 
 
+def read_roster(file, filename: str):
+    """Read an uploaded .csv/.xlsx roster into a DataFrame (pandas is loaded here)."""
+    import pandas as pd
+
+    if filename.lower().endswith('.csv'):
+        return pd.read_csv(file)
+    if filename.lower().endswith('.xlsx'):
+        # openpyxl is the default modern engine for .xlsx
+        return pd.read_excel(file, engine='openpyxl')
+    raise ValueError("Unsupported file type. Please upload .csv or .xlsx")
+
+
+def _cell_str(value) -> str:
+    # Empty spreadsheet cells come through as NaN
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return str(value).strip()
+
+
+def row_to_record(row) -> dict:
+    """Normalize a roster row (DataFrame row or dict) into certificate data fields."""
+    return {
+        'Recipient Name': str(row['Recipient Name']).strip(),
+        'Course Name': str(row['Course Name']).strip(),
+        'Certificate Date': str(row['Certificate Date']).strip(),
+        'Issuing Organization': str(row['Issuing Organization']).strip(),
+        'Certificate Title': _cell_str(row['Certificate Title']),
+        'Certificate Description': _cell_str(row['Certificate Description']),
+    }
+
+
+def record_cert_hash(record: dict) -> str:
+    return compute_cert_hash(record['Recipient Name'], record['Course Name'],
+                             record['Certificate Date'], record['Issuing Organization'])
+
+
+def username_hash(username: str) -> str:
+    """SHA-256 hex of an already normalized username, as embedded in the stego payload."""
+    return hashlib.sha256(username.encode('utf-8')).hexdigest()
+
+
+def record_name_hash(record: dict) -> str:
+    return username_hash(normalize_username(record['Recipient Name']))
+
+
+def sign_records(records: list[dict]) -> list[str | None]:
+    """Pre-sign a batch of records (one shared issue time); all None when signing is off."""
+    if token_signer is None:
+        return [None] * len(records)
+    return token_signer.sign_many([(record_cert_hash(r), record_name_hash(r)) for r in records])
+
+
+def verify_signed_token(token: str, cert_id: str | None = None) -> dict | None:
+    """Offline check of a signed token; optionally also that it belongs to ``cert_id``.
+
+    Returns the token's ``cert_hash``, ``name_hash`` and ``issued_at``; use
+    :func:`token_matches_name` to check the recipient.
+    """
+    if token_signer is None or not token:
+        return None
+    claims = token_signer.verify(token)
+    if claims is None or (cert_id and not hmac.compare_digest(claims['cert_hash'].encode('utf-8'),
+                                                              cert_id.lower().encode('utf-8'))):
+        return None
+    return claims
+
+
+def token_matches_name(claims: dict, name_hash: str) -> bool:
+    """Whether verified token ``claims`` were issued to the name with hex hash ``name_hash``."""
+    signed = claims['name_hash']
+    return hmac.compare_digest(signed.encode('utf-8'), name_hash[:len(signed)].lower().encode('utf-8'))
+
+
+def _certificate_qr_and_message(record: dict, token: str | None):
+    cert_hash = record_cert_hash(record)
+    # SHA-256 of normalized username (recipient name) goes into the stego payload
+    sha = record_name_hash(record)
+    if token is None and token_signer is not None:
+        token = token_signer.sign(cert_hash, sha)
+    # The token already carries the cert hash; repeating it as cert_id would push the
+    # QR code to a version that no longer scans at the default 120 px
+    verify_url = f"{PUBLIC_VERIFY_BASE}?t={token}" if token else f"{PUBLIC_VERIFY_BASE}?cert_id={cert_hash}"
+    qr_img = generate_qr_image(verify_url)
+
+    # The cert hash (or the token, which carries it) lets POST /verify check revocation
+    message = f"{sha}.{token or cert_hash}"
+    return cert_hash, qr_img, message
+
+
+def _render_certificate(record: dict, layout: dict | None, token: str | None) -> tuple[str, bytes, bool]:
+    # Also returns whether the layout's border was drawn
+    cert_hash, qr_img, message = _certificate_qr_and_message(record, token)
+    base, border_ok = _draw_certificate(record, qr_img, layout, 1.0, Image.LANCZOS)
+    # Stego goes into the pixel buffer so the PNG is encoded once, as in the strip path
+    rows = np.asarray(base.convert('RGB')).copy()
+    height, width = rows.shape[:2]
+    apply_embedding_to_rows(rows, 0, *plan_embedding(message, width, height, key=STEGO_KEY,
+                                                     redundancy=STEGO_REDUNDANCY))
+    out = io.BytesIO()
+    Image.fromarray(rows).save(out, format='PNG')
+    return cert_hash, out.getvalue(), border_ok
+
+
+def render_certificate(record: dict, layout: dict | None, token: str | None = None) -> tuple[str, bytes]:
+    """Full render pipeline shared by the HTTP routes and the bulk CLI.
+
+    Returns ``(cert_hash, png_bytes)`` with the recipient hash embedded. With
+    signing enabled the token (pre-signed by :func:`sign_records` or signed here)
+    is added to the QR URL and appended to the stego payload.
+    """
+    cert_hash, png_bytes, _ = _render_certificate(record, layout, token)
+    return cert_hash, png_bytes
+
+
+def render_certificate_print(record: dict, layout: dict | None, scale: float, fileobj,
+                             dpi: float | None = None) -> tuple[str, bool]:
+    """Print-resolution variant of :func:`render_certificate`, streamed to ``fileobj`` in strips.
+
+    Returns ``(cert_hash, border_ok)``; see :func:`write_certificate_png_tiled`.
+    """
+    cert_hash, qr_img, message = _certificate_qr_and_message(record, None)
+    border_ok = write_certificate_png_tiled(record, qr_img, layout, scale, fileobj, stego_message=message, dpi=dpi)
+    return cert_hash, border_ok
+
+
+def dedupe_records(records: list[dict]) -> list[tuple[str, dict, list[int]]]:
+    """Group identical roster records (all fields), in first-seen order.
+
+    Returns ``(cert_hash, record, row_indices)`` per distinct certificate. Rows
+    that share a cert hash but differ in title or description stay separate
+    groups; see :func:`conflicting_hashes`.
+    """
+    groups: dict[tuple, tuple[str, dict, list[int]]] = {}
+    for idx, record in enumerate(records):
+        key = tuple(record[field] for field in REQUIRED_COLUMNS)
+        if key in groups:
+            groups[key][2].append(idx)
+        else:
+            groups[key] = (record_cert_hash(record), record, [idx])
+    return list(groups.values())
+
+
+def conflicting_hashes(groups: list[tuple[str, dict, list[int]]]) -> set[str]:
+    """Cert hashes shared by groups with different fields; the DB keeps the last one's fields."""
+    seen: set[str] = set()
+    conflicts: set[str] = set()
+    for cert_hash, _, _ in groups:
+        (conflicts if cert_hash in seen else seen).add(cert_hash)
+    return conflicts
+
+
+def duplicates_csv(groups: list[tuple[str, dict, list[int]]]) -> str:
+    """CSV report of duplicate and conflicting rows (1-based, as in certificate_<n>.png).
+
+    ``duplicate`` rows are identical to an earlier row and share its file.
+    ``conflict`` rows have their own file but share a cert hash with a row whose
+    title or description differs, so verification shows the last such row's fields.
+    """
+    conflicts = conflicting_hashes(groups)
+    entries = []
+    for cert_hash, _, rows in groups:
+        if cert_hash in conflicts:
+            entries.append((rows[0], rows[0], cert_hash, 'conflict'))
+        entries.extend((idx, rows[0], cert_hash, 'duplicate') for idx in rows[1:])
+    lines = ['row,certificate_file,cert_hash,status']
+    for idx, file_idx, cert_hash, status in sorted(entries):
+        lines.append(f"{idx + 1},certificate_{file_idx + 1}.png,{cert_hash},{status}")
+    return '\n'.join(lines) + '\n'
+
+
+def upsert_certificate(session, cert_hash: str, record: dict) -> bool:
+    """Insert or update a certificate row; returns True if it already existed."""
+    existing = session.get(Certificate, cert_hash)
+    if not existing:
+        session.add(Certificate(
+            cert_hash=cert_hash,
+            recipient_name=record['Recipient Name'],
+            course_name=record['Course Name'],
+            certificate_date=record['Certificate Date'],
+            issuing_organization=record['Issuing Organization'],
+            certificate_title=record['Certificate Title'],
+            certificate_description=record['Certificate Description'],
+        ))
+    else:
+        # Update fields without changing key
+        existing.recipient_name = record['Recipient Name']
+        existing.course_name = record['Course Name']
+        existing.certificate_date = record['Certificate Date']
+        existing.issuing_organization = record['Issuing Organization']
+        existing.certificate_title = record['Certificate Title']
+        existing.certificate_description = record['Certificate Description']
+    return existing is not None
+
+
+_render_queue = threading.BoundedSemaphore(RENDER_CONCURRENCY + RENDER_QUEUE_SIZE)
+_render_slots = threading.BoundedSemaphore(RENDER_CONCURRENCY)
+
+
+def _busy_response(reason: str, status: int):
+    resp = jsonify({"error": "Server is busy, please retry shortly", "reason": reason})
+    resp.status_code = status
+    resp.headers['Retry-After'] = str(RENDER_RETRY_AFTER)
+    return resp
+
+
+def run_with_render_admission(fn, *args, **kwargs):
+    """Run ``fn`` in a render slot, or return a 429/503 + Retry-After response when saturated."""
+    if not _render_queue.acquire(blocking=False):
+        return _busy_response("render_queue_full", 429)
+    try:
+        if not _render_slots.acquire(timeout=RENDER_QUEUE_TIMEOUT):
+            return _busy_response("render_queue_timeout", 503)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _render_slots.release()
+    finally:
+        _render_queue.release()
+
+
+def render_admission(view):
+    """Bound concurrent CPU-heavy renders; reject with 429/503 + Retry-After when saturated."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return run_with_render_admission(view, *args, **kwargs)
+    return wrapper
+
+
+render_cache = RenderCache(RENDER_CACHE_ITEMS, RENDER_CACHE_BYTES, RENDER_CACHE_DIR, RENDER_CACHE_DISK_BYTES)
+# Settings that change the rendered bytes for identical input
+# Bump when drawing changes, so persisted (disk tier) renders are not served stale
+RENDER_VERSION = 3
+_RENDER_CONFIG_FINGERPRINT = hashlib.sha256(json.dumps(
+    [RENDER_VERSION, PUBLIC_VERIFY_BASE, STEGO_KEY, STEGO_REDUNDANCY, TOKEN_SIGNING_KEY]
+).encode('utf-8')).hexdigest()
+
+
+def render_cache_key(record: dict, layout: dict | None, scale: float = 1.0) -> str:
+    canonical = json.dumps([_RENDER_CONFIG_FINGERPRINT, record, layout, scale],
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _png_download(png, etag: str | None, cache_status: str):
+    # png is either bytes or a seekable file object positioned at the start
+    body = io.BytesIO(png) if isinstance(png, (bytes, bytearray)) else png
+    resp = send_file(body, mimetype='image/png', as_attachment=True, download_name='certificate.png')
+    if etag is None:
+        # Degraded render (border missing): the next request must render again
+        resp.headers['Cache-Control'] = 'no-store'
+    else:
+        resp.set_etag(etag)
+        # Let the browser keep the file but revalidate with If-None-Match
+        resp.headers['Cache-Control'] = 'private, no-cache'
+    resp.headers['X-Cache'] = cache_status
+    return resp
+
+
 @app.post('/generate_png')
 def generate_png():
     try:
@@ -488,59 +1075,119 @@ def generate_png():
         data = payload.get('data') or {}
         layout = payload.get('layout')
 
-        recipient = str(data.get('Recipient Name', '')).strip()
-        course = str(data.get('Course Name', '')).strip()
-        cert_date = str(data.get('Certificate Date', '')).strip()
-        issuer = str(data.get('Issuing Organization', '')).strip()
-        title = str(data.get('Certificate Title', '')).strip()
-        desc = str(data.get('Certificate Description', '')).strip()
-
-        # Compute verification hash as before to create QR code URL
-        cert_hash = compute_cert_hash(recipient, course, cert_date, issuer)
-        verify_url = f"{PUBLIC_VERIFY_BASE}?cert_id={cert_hash}"
-        qr_img = generate_qr_image(verify_url)
-
-        # Build base PNG bytes
-        png_bytes = build_certificate_png_bytes({
-            'Recipient Name': recipient,
-            'Course Name': course,
-            'Certificate Date': cert_date,
-            'Issuing Organization': issuer,
-            'Certificate Title': title,
-            'Certificate Description': desc,
-        }, qr_img, layout)
-
-        # Compute SHA-256 of normalized username (recipient name)
-        username_string = normalize_username(recipient)
-        sha = hashlib.sha256(username_string.encode('utf-8')).hexdigest()
-
-        # Write to temp, embed stego, return
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_in:
-            tmp_in.write(png_bytes)
-            tmp_in.flush()
-            in_path = tmp_in.name
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_out:
-            out_path = tmp_out.name
-        try:
-            embed_message(in_path, out_path, sha)
-            with open(out_path, 'rb') as f:
-                final_png = f.read()
-        finally:
-            try:
-                os.remove(in_path)
-            except Exception:
-                pass
-            try:
-                os.remove(out_path)
-            except Exception:
-                pass
+        record = {field: str(data.get(field, '')).strip() for field in REQUIRED_COLUMNS}
 
-        return send_file(io.BytesIO(final_png), mimetype='image/png', as_attachment=True, download_name='certificate.png')
+        # Optional print resolution: 'dpi' (the layout is 96 dpi) or a direct 'scale'
+        try:
+            dpi = float(payload['dpi']) if payload.get('dpi') else None
+            scale = dpi / REFERENCE_DPI if dpi else float(payload.get('scale') or 1.0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "dpi and scale must be numbers"}), 400
+        if not 0 < scale <= MAX_RENDER_SCALE:
+            return jsonify({"error": f"scale must be between 0 and {MAX_RENDER_SCALE} (dpi up to {int(MAX_RENDER_SCALE * REFERENCE_DPI)})"}), 400
+
+        # Output is a pure function of the normalized input, so the key doubles as the ETag
+        key = render_cache_key(record, layout, scale)
+        if request.if_none_match.contains(key):
+            resp = app.response_class(status=304)
+            resp.set_etag(key)
+            return resp
+
+        if scale != 1.0:
+            def _render_print():
+                # Strip-rendered to a temp file so memory stays bounded; too large for the cache
+                out = tempfile.TemporaryFile()
+                _, border_ok = render_certificate_print(record, layout, scale, out, dpi=dpi or REFERENCE_DPI * scale)
+                out.seek(0)
+                return _png_download(out, key if border_ok else None, 'MISS')
+            return run_with_render_admission(_render_print)
+
+        cached = render_cache.get(key)
+        if cached is not None:
+            return _png_download(cached, key, 'HIT')
+
+        def _render():
+            _, final_png, border_ok = _render_certificate(record, layout, None)
+            if not border_ok:
+                # A failed border fetch is usually transient; don't pin the borderless render
+                return _png_download(final_png, None, 'MISS')
+            render_cache.put(key, final_png)
+            return _png_download(final_png, key, 'MISS')
+
+        # Only actual renders go through admission control; hits and 304s never wait
+        return run_with_render_admission(_render)
     except Exception as e:
         return jsonify({"error": f"Failed to generate PNG: {str(e)}"}), 500
 
 
+PREVIEW_DEFAULT_WIDTH = 400
+PREVIEW_MAX_WIDTH = 1200
+# format -> (PIL format, mimetype, save options tuned for encode speed)
+PREVIEW_FORMATS = {
+    'png': ('PNG', 'image/png', {'compress_level': 1}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 80}),
+    'webp': ('WEBP', 'image/webp', {'quality': 75, 'method': 0}),
+}
+
+
+@lru_cache(maxsize=1)
+def _preview_qr_image():
+    # A preview is never scanned, so every preview shares one QR with the same module
+    # count as a real certificate's; building a QR is about half the preview's cost
+    if token_signer is not None:
+        placeholder = f"{PUBLIC_VERIFY_BASE}?t={'0' * token_length()}"
+    else:
+        placeholder = f"{PUBLIC_VERIFY_BASE}?cert_id={'0' * 64}"
+    return generate_qr_image(placeholder)
+
+
+@app.post('/preview_png')
+def preview_png():
+    """Fast, low-resolution preview for the layout editor.
+
+    Takes the same ``data``/``layout`` body as ``/generate_png`` plus optional
+    ``width`` (default 400, max 1200) and ``format`` (png, jpeg or webp). There is no
+    stego embedding and no database write, and the output is never larger than the
+    full-size certificate. The QR code is a placeholder of the real one's size.
+    Previews share the render gate with ``/generate_png``.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        data = payload.get('data') or {}
+        layout = payload.get('layout')
+        fmt = str(payload.get('format') or 'png').lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in PREVIEW_FORMATS:
+            return jsonify({"error": "format must be png, jpeg or webp"}), 400
+        try:
+            target_width = int(payload.get('width') or PREVIEW_DEFAULT_WIDTH)
+        except (TypeError, ValueError):
+            return jsonify({"error": "width must be an integer"}), 400
+        target_width = min(max(target_width, 16), PREVIEW_MAX_WIDTH)
+
+        record = {field: str(data.get(field, '')).strip() for field in REQUIRED_COLUMNS}
+        ref_w, _ = _reference_size(layout)
+        scale = min(1.0, target_width / float(ref_w))
+
+        def _render_preview():
+            img = render_certificate_image(record, _preview_qr_image(), layout, scale=scale,
+                                           resample=Image.BILINEAR)
+            pil_format, mimetype, options = PREVIEW_FORMATS[fmt]
+            out = io.BytesIO()
+            img.convert('RGB').save(out, format=pil_format, **options)
+            out.seek(0)
+            resp = send_file(out, mimetype=mimetype)
+            resp.headers['Cache-Control'] = 'no-store'
+            return resp
+
+        return run_with_render_admission(_render_preview)
+    except Exception as e:
+        return jsonify({"error": f"Failed to render preview: {str(e)}"}), 500
+
+
 @app.post('/bulk_generate')
+@render_admission
 def bulk_generate():
     try:
         if 'file' not in request.files:
@@ -561,14 +1208,10 @@ def bulk_generate():
         print(f"=== END FORM DATA DEBUG ===")
 
         filename = file.filename.lower()
+        if not filename.endswith(('.csv', '.xlsx')):
+            return jsonify({"error": "Unsupported file type. Please upload .csv or .xlsx"}), 400
         try:
-            if filename.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif filename.endswith('.xlsx'):
-                # openpyxl is the default modern engine for .xlsx
-                df = pd.read_excel(file, engine='openpyxl')
-            else:
-                return jsonify({"error": "Unsupported file type. Please upload .csv or .xlsx"}), 400
+            df = read_roster(file, filename)
         except Exception as e:
             return jsonify({"error": f"Failed to read file: {str(e)}"}), 400
 
@@ -611,90 +1254,50 @@ def bulk_generate():
         zip_mem = io.BytesIO()
         zf = zipfile.ZipFile(zip_mem, mode='w', compression=zipfile.ZIP_DEFLATED)
 
+        # Identical rows are rendered once. 'copy' (default) still writes one file per
+        # row; 'skip' writes the first file only. Both add duplicates.csv, which also
+        # lists rows that share a cert hash but differ in title or description.
+        duplicate_mode = (request.form.get('duplicates') or 'copy').strip().lower()
+        if duplicate_mode not in ('copy', 'skip'):
+            return jsonify({"error": "duplicates must be 'copy' or 'skip'"}), 400
+        groups = dedupe_records([row_to_record(row) for _, row in df.iterrows()])
+        duplicate_rows = len(df) - len(groups)
+        conflicts = conflicting_hashes(groups)
+        if duplicate_rows:
+            print(f"Found {duplicate_rows} duplicate rows; rendering {len(groups)} distinct certificates")
+        if conflicts:
+            print(f"{len(conflicts)} cert hashes have rows with differing title or description")
+
+        tokens = sign_records([record for _, record, _ in groups])
+
         created = 0
-        session = SessionLocal()
+        existing_count = 0
+        # One DB row per cert hash; with conflicts it keeps the last row's fields
+        db_records = {cert_hash: record for cert_hash, record, _ in groups}
+        session = get_session()
         try:
-            for idx, row in df.iterrows():
-                recipient = str(row['Recipient Name']).strip()
-                course = str(row['Course Name']).strip()
-                cert_date = str(row['Certificate Date']).strip()
-                issuer = str(row['Issuing Organization']).strip()
-                title = str(row['Certificate Title']).strip() if not pd.isna(row['Certificate Title']) else ''
-                desc = str(row['Certificate Description']).strip() if not pd.isna(row['Certificate Description']) else ''
-
-                cert_hash = compute_cert_hash(recipient, course, cert_date, issuer)
-
-                # Upsert into DB
-                existing = session.get(Certificate, cert_hash)
-                if not existing:
-                    session.add(Certificate(
-                        cert_hash=cert_hash,
-                        recipient_name=recipient,
-                        course_name=course,
-                        certificate_date=cert_date,
-                        issuing_organization=issuer,
-                        certificate_title=title,
-                        certificate_description=desc,
-                    ))
-                else:
-                    # Update fields without changing key
-                    existing.recipient_name = recipient
-                    existing.course_name = course
-                    existing.certificate_date = cert_date
-                    existing.issuing_organization = issuer
-                    existing.certificate_title = title
-                    existing.certificate_description = desc
-
-                verify_url = f"{PUBLIC_VERIFY_BASE}?cert_id={cert_hash}"
-                qr_img = generate_qr_image(verify_url)
-
-                # Build PNG and embed steganographic username hash
-                png_bytes = build_certificate_png_bytes({
-                    'Recipient Name': recipient,
-                    'Course Name': course,
-                    'Certificate Date': cert_date,
-                    'Issuing Organization': issuer,
-                    'Certificate Title': title,
-                    'Certificate Description': desc,
-                }, qr_img, layout)
-
-                username_string = normalize_username(recipient)
-                sha = hashlib.sha256(username_string.encode('utf-8')).hexdigest()
-
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_in:
-                    tmp_in.write(png_bytes)
-                    tmp_in.flush()
-                    in_path = tmp_in.name
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_out:
-                    out_path = tmp_out.name
-                try:
-                    embed_message(in_path, out_path, sha)
-                    with open(out_path, 'rb') as f:
-                        final_png = f.read()
-                finally:
-                    try:
-                        os.remove(in_path)
-                    except Exception:
-                        pass
-                    try:
-                        os.remove(out_path)
-                    except Exception:
-                        pass
+            for n, (cert_hash, record, rows) in enumerate(groups):
+                _, final_png = render_certificate(record, layout, tokens[n])
+                db_record = db_records.pop(cert_hash, None)
+                if db_record is not None and upsert_certificate(session, cert_hash, db_record):
+                    existing_count += 1
 
                 # Debug: Check if layout was used for this certificate
-                if idx == 0:  # Only print for first certificate to avoid spam
+                if n == 0:  # Only print for first certificate to avoid spam
                     print(f"=== CERTIFICATE GENERATION SUMMARY ===")
-                    print(f"Certificate {idx + 1}: {recipient}")
+                    print(f"Certificate {rows[0] + 1}: {record['Recipient Name']}")
                     print(f"Layout provided: {layout is not None}")
                     if layout:
                         print(f"Layout elements: {list(layout.get('elements', {}).keys())}")
                         print(f"Layout dimensions: {layout.get('referenceDimensions')}")
                     print(f"=== END SUMMARY ===")
 
-                png_name = f"certificate_{idx + 1}.png"
-                zf.writestr(png_name, final_png)
-                created += 1
+                for idx in (rows if duplicate_mode == 'copy' else rows[:1]):
+                    zf.writestr(f"certificate_{idx + 1}.png", final_png)
+                    created += 1
 
+            if duplicate_rows or conflicts:
+                zf.writestr('duplicates.csv', duplicates_csv(groups))
             session.commit()
             print(f"Successfully generated {created} certificates")
         except Exception as e:
@@ -706,12 +1309,18 @@ def bulk_generate():
             session.close()
 
         zip_mem.seek(0)
-        return send_file(
+        resp = send_file(
             zip_mem,
             mimetype='application/zip',
             as_attachment=True,
             download_name=f'certificates_{created}.zip'
         )
+        resp.headers['X-Duplicate-Rows'] = str(duplicate_rows)
+        # Cert hashes whose rows disagree on title/description (listed in duplicates.csv)
+        resp.headers['X-Conflicting-Certificates'] = str(len(conflicts))
+        # Certificates already issued by an earlier run (same hash in the DB)
+        resp.headers['X-Existing-Certificates'] = str(existing_count)
+        return resp
     except Exception as e:
         print(f"Unexpected error in bulk_generate: {e}")
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
@@ -725,13 +1334,10 @@ def bulk_preview_sample():
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
     filename = file.filename.lower()
+    if not filename.endswith(('.csv', '.xlsx')):
+        return jsonify({"error": "Unsupported file type. Please upload .csv or .xlsx"}), 400
     try:
-        if filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        elif filename.endswith('.xlsx'):
-            df = pd.read_excel(file, engine='openpyxl')
-        else:
-            return jsonify({"error": "Unsupported file type. Please upload .csv or .xlsx"}), 400
+        df = read_roster(file, filename)
     except Exception as e:
         return jsonify({"error": f"Failed to read file: {str(e)}"}), 400
 
@@ -742,15 +1348,7 @@ def bulk_preview_sample():
     if df.empty:
         return jsonify({"error": "No rows found in the file"}), 400
 
-    r0 = df.iloc[0]
-    sample = {
-        'Recipient Name': str(r0['Recipient Name']).strip(),
-        'Course Name': str(r0['Course Name']).strip(),
-        'Certificate Date': str(r0['Certificate Date']).strip(),
-        'Issuing Organization': str(r0['Issuing Organization']).strip(),
-        'Certificate Title': str(r0['Certificate Title']).strip() if not pd.isna(r0['Certificate Title']) else '',
-        'Certificate Description': str(r0['Certificate Description']).strip() if not pd.isna(r0['Certificate Description']) else '',
-    }
+    sample = row_to_record(df.iloc[0])
     return jsonify({"sample": sample})
 
 
@@ -778,7 +1376,18 @@ VERIFY_TEMPLATE = """
   </head>
   <body>
     <div class="card">
-      {% if cert %}
+      {% if revocation %}
+        <h2 class="bad">Certificate Revoked</h2>
+        <p>The certificate with ID <code>{{ cert_id }}</code> was revoked on {{ revocation.revoked_at.strftime('%Y-%m-%d') }}.</p>
+        {% if revocation.reason %}<p>Reason: {{ revocation.reason }}</p>{% endif %}
+      {% elif issued_on %}
+        <h2 class="ok">Certificate Verified</h2>
+        <p>This certificate carries a valid signature from its issuer and was issued on {{ issued_on }}.</p>
+        <dl>
+          <dt>Hash</dt><dd><code>{{ cert_id }}</code></dd>
+        </dl>
+        <p><a href="?cert_id={{ cert_id }}">Show certificate details</a></p>
+      {% elif cert %}
         <h2 class="ok">Certificate Verified</h2>
         <p>This certificate is valid. Details:</p>
         <dl>
@@ -786,8 +1395,8 @@ VERIFY_TEMPLATE = """
           <dt>Course Name</dt><dd>{{ cert.course_name }}</dd>
           <dt>Certificate Date</dt><dd>{{ cert.certificate_date }}</dd>
           <dt>Issuing Organization</dt><dd>{{ cert.issuing_organization }}</dd>
-          <dt>Title</dt><dd>{{ cert.certificate_title }}</dd>
-          <dt>Description</dt><dd>{{ cert.certificate_description }}</dd>
+          {% if cert.certificate_title is not none %}<dt>Title</dt><dd>{{ cert.certificate_title }}</dd>{% endif %}
+          {% if cert.certificate_description is not none %}<dt>Description</dt><dd>{{ cert.certificate_description }}</dd>{% endif %}
           <dt>Hash</dt><dd><code>{{ cert.cert_hash }}</code></dd>
         </dl>
       {% else %}
@@ -800,51 +1409,320 @@ VERIFY_TEMPLATE = """
 """
 
 
+def certificate_to_dict(cert: Certificate) -> dict:
+    return {
+        'cert_hash': cert.cert_hash,
+        'recipient_name': cert.recipient_name,
+        'course_name': cert.course_name,
+        'certificate_date': cert.certificate_date,
+        'issuing_organization': cert.issuing_organization,
+        'certificate_title': cert.certificate_title,
+        'certificate_description': cert.certificate_description,
+        'created_at': cert.created_at.isoformat() if cert.created_at else None,
+    }
+
+
+def _encode_cursor(cert: Certificate) -> str:
+    raw = f"{cert.created_at.isoformat() if cert.created_at else ''}|{cert.cert_hash}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    created_at, cert_hash = raw.split('|', 1)
+    return datetime.fromisoformat(created_at), cert_hash
+
+
+def _fts_query(q: str) -> str:
+    # Each word becomes a quoted prefix term, so user input cannot inject FTS syntax
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in q.split())
+
+
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 500
+
+
+def require_admin(view):
+    """Require ``Authorization: Bearer <ADMIN_TOKEN>``; without ADMIN_TOKEN the view is disabled."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled: ADMIN_TOKEN is not configured"}), 503
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {ADMIN_TOKEN}".encode('utf-8')):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.get('/certificates')
+@require_admin
+def list_certificates():
+    """Search/list certificates, newest first, with keyset pagination.
+
+    Query params: ``q`` (recipient name search), ``recipient``, ``course``,
+    ``organization`` (exact match), ``created_from``/``created_to`` (ISO dates,
+    inclusive; a date-only ``created_to`` covers that whole day),
+    ``limit`` and ``cursor`` (``next_cursor`` from the previous page).
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', LIST_DEFAULT_LIMIT)), 1), LIST_MAX_LIMIT)
+        created_from = datetime.fromisoformat(args['created_from']) if args.get('created_from') else None
+        created_to_raw = (args.get('created_to') or '').strip()
+        created_to = datetime.fromisoformat(created_to_raw) if created_to_raw else None
+        cursor = _decode_cursor(args['cursor']) if args.get('cursor') else None
+    except Exception:
+        return jsonify({"error": "Invalid limit, date or cursor parameter"}), 400
+
+    stmt = select(Certificate)
+    exact_filters = {
+        'recipient': Certificate.recipient_name,
+        'course': Certificate.course_name,
+        'organization': Certificate.issuing_organization,
+    }
+    for param, column in exact_filters.items():
+        value = (args.get(param) or '').strip()
+        if value:
+            stmt = stmt.where(column == value)
+    if created_from is not None:
+        stmt = stmt.where(Certificate.created_at >= created_from)
+    if created_to is not None:
+        if len(created_to_raw) == 10:
+            # Date only: parsed as midnight, so compare against the start of the next day
+            stmt = stmt.where(Certificate.created_at < created_to + timedelta(days=1))
+        else:
+            stmt = stmt.where(Certificate.created_at <= created_to)
+
+    q = (args.get('q') or '').strip()
+    if q:
+        if _fts_enabled:
+            stmt = stmt.where(text(
+                "certificates.cert_hash IN (SELECT i.cert_hash FROM certificates_name_fts f "
+                "JOIN certificates_fts_ids i ON i.id = f.rowid WHERE certificates_name_fts MATCH :fts)"
+            ).bindparams(fts=_fts_query(q)))
+        else:
+            escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            stmt = stmt.where(Certificate.recipient_name.ilike(f"%{escaped}%", escape='\\'))
+
+    if cursor is not None:
+        cursor_created, cursor_hash = cursor
+        stmt = stmt.where(or_(
+            Certificate.created_at < cursor_created,
+            and_(Certificate.created_at == cursor_created, Certificate.cert_hash < cursor_hash),
+        ))
+    # Fetch one extra row to know whether there is a next page
+    stmt = stmt.order_by(Certificate.created_at.desc(), Certificate.cert_hash.desc()).limit(limit + 1)
+
+    session = get_session()
+    try:
+        rows = session.execute(stmt).scalars().all()
+    finally:
+        session.close()
+
+    page = rows[:limit]
+    next_cursor = _encode_cursor(page[-1]) if len(rows) > limit and page else None
+    return jsonify({
+        "items": [certificate_to_dict(c) for c in page],
+        "next_cursor": next_cursor,
+    })
+
+
+def _load_revocations_since(last_id: int) -> list[tuple[int, str]]:
+    session = get_session()
+    try:
+        rows = session.execute(
+            select(Revocation.id, Revocation.cert_hash).where(Revocation.id > last_id).order_by(Revocation.id)
+        ).all()
+        return [(row_id, cert_hash) for row_id, cert_hash in rows]
+    finally:
+        session.close()
+
+
+revocation_index = RevocationIndex(_load_revocations_since, refresh_interval=REVOCATION_REFRESH_SECONDS)
+
+
+def get_revocation(session, cert_hash: str) -> Revocation | None:
+    """Revocation record for ``cert_hash``; the DB is only queried on a bloom filter hit.
+
+    Call ``revocation_index.refresh()`` before opening ``session``: a refresh needs a
+    connection of its own, and taking it while holding the request's connection can
+    exhaust the pool under load.
+    """
+    if not revocation_index.might_be_revoked(cert_hash, refresh=False):
+        return None
+    return session.execute(select(Revocation).where(Revocation.cert_hash == cert_hash)).scalar_one_or_none()
+
+
+@app.post('/certificates/<cert_hash>/revoke')
+@require_admin
+def revoke_certificate(cert_hash: str):
+    payload = request.get_json(silent=True) or {}
+    session = get_session()
+    try:
+        if session.get(Certificate, cert_hash) is None:
+            return jsonify({"error": "Certificate not found"}), 404
+        existing = session.execute(select(Revocation).where(Revocation.cert_hash == cert_hash)).scalar_one_or_none()
+        if existing is None:
+            existing = Revocation(cert_hash=cert_hash, reason=payload.get('reason'))
+            session.add(existing)
+            session.commit()
+        revocation_index.add(cert_hash)
+        return jsonify({"cert_hash": cert_hash, "revoked": True, "revoked_at": existing.revoked_at.isoformat(),
+                        "reason": existing.reason})
+    finally:
+        session.close()
+
+
+@app.post('/certificates/<cert_hash>/unrevoke')
+@require_admin
+def unrevoke_certificate(cert_hash: str):
+    # This worker rebuilds its filter on the next refresh. Other workers keep a stale
+    # bit until their hourly rebuild; that only costs a DB lookup, never a wrong answer.
+    session = get_session()
+    try:
+        existing = session.execute(select(Revocation).where(Revocation.cert_hash == cert_hash)).scalar_one_or_none()
+        if existing is not None:
+            session.delete(existing)
+            session.commit()
+            revocation_index.invalidate()
+        return jsonify({"cert_hash": cert_hash, "revoked": False})
+    finally:
+        session.close()
+
+
 @app.get('/verify')
 def verify():
     cert_id = request.args.get('cert_id', '').strip()
+    token = request.args.get('t', '').strip()
+    claims = verify_signed_token(token, cert_id or None) if token else None
     if not cert_id:
-        return render_template_string(VERIFY_TEMPLATE, cert=None, cert_id=''), 400
-    session = SessionLocal()
+        # Signed QR codes link with ?t=<token> only. If the signature does not check out
+        # (e.g. the signing key was rotated or unset) the table still knows the certificate.
+        cert_id = claims['cert_hash'] if claims is not None else (unverified_cert_hash(token) or '')
+    if not cert_id:
+        return render_template_string(VERIFY_TEMPLATE, cert=None, cert_id='', revocation=None), 400
+    revocation_index.refresh()
+    if claims is not None:
+        # A valid token is answered from its claims and the revocation filter alone;
+        # only a filter hit needs the database
+        revocation = None
+        if revocation_index.might_be_revoked(cert_id, refresh=False):
+            session = get_session()
+            try:
+                revocation = get_revocation(session, cert_id)
+            finally:
+                session.close()
+        issued_on = datetime.fromtimestamp(claims['issued_at'], timezone.utc).strftime('%Y-%m-%d')
+        return render_template_string(VERIFY_TEMPLATE, cert=None, cert_id=cert_id, revocation=revocation,
+                                      issued_on=issued_on), 410 if revocation else 200
+    session = get_session()
     try:
         cert = session.get(Certificate, cert_id)
-        return render_template_string(VERIFY_TEMPLATE, cert=cert, cert_id=cert_id), (200 if cert else 404)
+        revocation = get_revocation(session, cert_id) if cert else None
+        status = 200 if cert and not revocation else (410 if cert else 404)
+        return render_template_string(VERIFY_TEMPLATE, cert=cert, cert_id=cert_id, revocation=revocation), status
+    finally:
+        session.close()
+
+
+VERIFY_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+# Upper bound on time spent trying extraction strategies for one uploaded file
+VERIFY_TIME_BUDGET = float(os.environ.get('VERIFY_TIME_BUDGET', '2.0'))
+
+
+def _verify_via_qr(username: str, cert_id: str | None, token: str | None, strategy_info: dict):
+    """Stego payload was unreadable but the QR code gave us the certificate id or a signed token."""
+    claims = verify_signed_token(token or '', cert_id)
+    if claims is None and not cert_id:
+        return jsonify({"status": "error", "valid": False, "reason": "invalid_token", **strategy_info}), 200
+    if claims is not None:
+        cert_id = claims['cert_hash']
+        # The token names the recipient by hash, so no database lookup is needed
+        is_match = token_matches_name(claims, username_hash(username))
+    else:
+        session = get_session()
+        try:
+            cert = session.get(Certificate, cert_id)
+            recipient = cert.recipient_name if cert else None
+        finally:
+            session.close()
+        if recipient is None:
+            return jsonify({"status": "error", "valid": False, "reason": "unknown_certificate",
+                            "cert_id": cert_id, **strategy_info}), 200
+        is_match = hmac.compare_digest(normalize_username(recipient).encode('utf-8'), username.encode('utf-8'))
+    resp = {
+        "status": "success",
+        "valid": bool(is_match),
+        "method": "qr",
+        "cert_id": cert_id,
+        "normalized_username": username,
+        **strategy_info,
+    }
+    if claims is not None:
+        resp["signed_token_valid"] = True
+    if not is_match:
+        resp["reason"] = "name_mismatch"
+    return _apply_revocation(resp, cert_id)
+
+
+def _apply_revocation(resp: dict, cert_id: str):
+    revocation_index.refresh()
+    session = get_session()
+    try:
+        revocation = get_revocation(session, cert_id)
     finally:
         session.close()
+    resp["revoked"] = revocation is not None
+    if revocation is not None:
+        resp["valid"] = False
+        resp["reason"] = "revoked"
+        resp["revoked_at"] = revocation.revoked_at.isoformat()
+    return jsonify(resp)
+
+
+def _is_sha256_hex(value: str) -> bool:
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value.lower())
 
 
 @app.post('/verify')
 def verify_png():
-    # Stego verification for uploaded PNG and username
+    # Stego verification for an uploaded certificate image and username
     if 'file' not in request.files:
         return jsonify({"status": "error", "valid": False, "reason": "no_file"}), 400
     file = request.files['file']
     username = normalize_username(request.form.get('username') or '')
     if not username:
         return jsonify({"status": "error", "valid": False, "reason": "missing_username"}), 400
-    if not file.filename.lower().endswith('.png'):
+    if not file.filename.lower().endswith(VERIFY_IMAGE_EXTENSIONS):
         return jsonify({"status": "error", "valid": False, "reason": "invalid_file_type"}), 400
 
     try:
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            file.save(tmp)
-            tmp.flush()
-            path = tmp.name
-        try:
-            extracted = extract_message(path)
-        finally:
-            try:
-                os.remove(path)
-            except Exception:
-                pass
+        img = Image.open(io.BytesIO(file.read()))
+        img.load()
     except Exception:
-        return jsonify({"status": "error", "valid": False, "reason": "no_embedded_hash"}), 200
-
-    extracted_hex = (extracted or '').strip().lower()
+        return jsonify({"status": "error", "valid": False, "reason": "invalid_image"}), 400
+
+    deadline = time.perf_counter() + VERIFY_TIME_BUDGET
+    found = extract_certificate_payload(img, key=STEGO_KEY, redundancy=STEGO_REDUNDANCY,
+                                        time_budget=VERIFY_TIME_BUDGET)
+    strategy_info = {"strategy": found['strategy'], "attempts": found['attempts']}
+    if found['payload'] is None:
+        if found['cert_id'] or found['token']:
+            return _verify_via_qr(username, found['cert_id'], found['token'], strategy_info)
+        return jsonify({"status": "error", "valid": False, "reason": "no_embedded_hash", **strategy_info}), 200
+    extracted = found['payload']
+
+    # Payload is the name hash, followed by ".<cert hash>" or ".<signed token>" (certificates
+    # issued before either was added carry the name hash alone)
+    extracted_hex, _, suffix = (extracted or '').strip().partition('.')
+    extracted_hex = extracted_hex.lower()
+    embedded_cert_id = suffix.lower() if _is_sha256_hex(suffix) else None
+    token = None if embedded_cert_id else suffix
     # Validate payload looks like a SHA-256 hex (64 hex chars)
-    if len(extracted_hex) != 64 or any(c not in '0123456789abcdef' for c in extracted_hex):
+    if not _is_sha256_hex(extracted_hex):
         return jsonify({"status": "error", "valid": False, "reason": "no_embedded_hash"}), 200
-    expected_hex = hashlib.sha256(username.encode('utf-8')).hexdigest()
+    expected_hex = username_hash(username)
     is_match = hmac.compare_digest(extracted_hex, expected_hex)
 
     resp = {
@@ -854,12 +1732,84 @@ def verify_png():
         "extracted_hash": extracted_hex,
         "expected_hash": expected_hex,
         "normalized_username": username,
+        **strategy_info,
     }
     if not is_match:
         resp["reason"] = "name_mismatch"
+
+    cert_id = embedded_cert_id or (request.form.get('cert_id') or '').strip()
+    claims = verify_signed_token(token) if token else None
+    if claims is not None:
+        resp["signed_token_valid"] = True
+        # A valid token copied from someone else's certificate must not vouch for this name
+        if token_matches_name(claims, expected_hex):
+            cert_id = claims['cert_hash']
+            resp["cert_id"] = cert_id
+            resp["issued_at"] = claims['issued_at']
+        else:
+            resp["valid"] = False
+            resp["reason"] = "name_mismatch"
+    elif token and token_signer is not None:
+        resp["signed_token_valid"] = False
+
+    if not cert_id:
+        # Older certificates carry only the name hash; the QR code still names the certificate
+        qr_found = decode_verify_qr(img, deadline)
+        if qr_found is not None:
+            qr_cert_id, qr_token = qr_found
+            qr_claims = verify_signed_token(qr_token or '')
+            cert_id = qr_claims['cert_hash'] if qr_claims is not None else (qr_cert_id or '').strip()
+    # cert_id (from the payload, the signed token, the form or the QR code) adds a revocation check
+    if cert_id:
+        return _apply_revocation(resp, cert_id)
+    resp["revocation_checked"] = False
     return jsonify(resp)
 
+
+def warm_up_worker() -> None:
+    """Per-process warm-up: fonts, borders and a pooled DB connection."""
+    for bold in (False, True):
+        for size in (12, 14, 22, 24):
+            load_font(bold, size)
+    border_assets.prepare_all()
+    for url in WARM_BORDER_URLS:
+        if border_assets.resolve(url) is not None:
+            continue
+        try:
+            _fetch_border_bytes(url)
+        except Exception as e:
+            print(f"Border warm-up failed for {url}: {e}")
+    if WARM_HEAVY_IMPORTS:
+        import pandas  # noqa: F401
+        import qrcode  # noqa: F401
+        import requests  # noqa: F401
+        from reportlab.pdfgen import canvas  # noqa: F401
+
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text('SELECT 1'))
+        revocation_index.refresh(force=True)
+    except Exception as e:
+        print(f"DB warm-up failed: {e}")
+
+
+def create_app() -> Flask:
+    """App factory for multi-process WSGI servers (see backend/wsgi.py)."""
+    # Connections inherited from a preloading master must not be shared across workers
+    global _fts_enabled
+    if _engine is not None:
+        _engine.dispose()
+    if os.environ.get('SKIP_INIT_DB') == '1':
+        # Schema was created by the parent process
+        _fts_enabled = _detect_fts(get_engine())
+    else:
+        init_db()
+    warm_up_worker()
+    return app
+
+
 if __name__ == '__main__':
+    init_db()
     port = int(os.environ.get('PORT', '5000'))
     app.run(host='0.0.0.0', port=port)
 
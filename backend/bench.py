@@ -0,0 +1,149 @@
+"""Small benchmark for the backend.
+
+    python backend/bench.py [--rounds N]
+
+Prints worker startup cost in a fresh interpreter (module import, the
+``create_app()`` call every gunicorn worker makes, and the first /health)
+followed by per-stage render timings, then checks that the QR code on a
+rendered certificate still decodes with and without a signed token (exit
+status 1 if not; skipped unless OpenCV or pyzbar is installed).
+"""
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STARTUP_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+client = app.app.test_client()
+client.get('/health')
+t3 = time.perf_counter()
+print(f"{t1 - t0:.6f} {t2 - t0:.6f} {t3 - t0:.6f}")
+"""
+
+SAMPLE_DATA = {
+    'Recipient Name': 'Ada Lovelace',
+    'Course Name': 'Analytical Engines 101',
+    'Certificate Date': '2024-01-01',
+    'Issuing Organization': 'Example Institute',
+    'Certificate Title': 'Certificate of Completion',
+    'Certificate Description': 'For outstanding work on the first published algorithm.',
+}
+
+
+def _timed(fn, rounds: int) -> list[float]:
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def _report(label: str, samples: list[float]) -> None:
+    ms = [s * 1000 for s in samples]
+    print(f"{label:<28} median {statistics.median(ms):9.2f} ms   min {min(ms):9.2f} ms   n={len(ms)}")
+
+
+def _startup_samples(rounds: int, extra_env: dict) -> tuple[list[float], list[float], list[float]]:
+    imports, factories, healths = [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        # A throwaway database so create_app() does not touch certificates.db
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", **extra_env)
+        for _ in range(rounds):
+            out = subprocess.run(
+                [sys.executable, '-c', _STARTUP_SNIPPET],
+                cwd=BACKEND_DIR, capture_output=True, text=True, check=True, env=env,
+            )
+            imp, factory, health = (float(v) for v in out.stdout.split()[-3:])
+            imports.append(imp)
+            factories.append(factory)
+            healths.append(health)
+    return imports, factories, healths
+
+
+def measure_startup(rounds: int) -> None:
+    imports, factories, healths = _startup_samples(rounds, {'WARM_HEAVY_IMPORTS': '0'})
+    _report('startup: import app', imports)
+    _report('startup: create_app()', factories)
+    _report('startup: first /health', healths)
+    _, factories, _ = _startup_samples(rounds, {'WARM_HEAVY_IMPORTS': '1'})
+    _report('startup: create_app() (warm)', factories)
+
+
+def measure_render(rounds: int) -> None:
+    sys.path.insert(0, BACKEND_DIR)
+    import app as backend
+    from stego_lsb import embed_message, extract_message
+
+    qr_img = backend.generate_qr_image(f"{backend.PUBLIC_VERIFY_BASE}?cert_id={'0' * 64}")
+    _report('render: qr', _timed(lambda: backend.generate_qr_image('x' * 90), rounds))
+    _report('render: png', _timed(lambda: backend.build_certificate_png_bytes(SAMPLE_DATA, qr_img, None), rounds))
+    _report('render: full (qr+stego)', _timed(lambda: backend.render_certificate(SAMPLE_DATA, None), rounds))
+    _report('render: png 300dpi (strips)', _timed(
+        lambda: backend.write_certificate_png_tiled(SAMPLE_DATA, qr_img, None, 300 / backend.REFERENCE_DPI, io.BytesIO()),
+        rounds))
+    client = backend.app.test_client()
+    _report('render: preview (400px)', _timed(lambda: client.post('/preview_png', json={'data': SAMPLE_DATA}), rounds))
+
+    png_bytes = backend.build_certificate_png_bytes(SAMPLE_DATA, qr_img, None)
+    with tempfile.TemporaryDirectory() as tmp:
+        in_path = os.path.join(tmp, 'in.png')
+        out_path = os.path.join(tmp, 'out.png')
+        with open(in_path, 'wb') as f:
+            f.write(png_bytes)
+        message = 'a' * 64
+        _report('stego: embed', _timed(lambda: embed_message(in_path, out_path, message), rounds))
+        _report('stego: extract', _timed(lambda: extract_message(out_path), rounds))
+        _report('stego: embed (keyed)', _timed(lambda: embed_message(in_path, out_path, message, key='bench'), rounds))
+        _report('stego: extract (keyed)', _timed(lambda: extract_message(out_path, key='bench'), rounds))
+
+
+def check_qr() -> bool:
+    """Decode the QR code back out of rendered certificates, unsigned and signed."""
+    sys.path.insert(0, BACKEND_DIR)
+    import importlib.util
+
+    import app as backend
+    from PIL import Image
+    from robust_extract import _decode_qr_text
+    from signed_token import TokenSigner
+
+    if not (importlib.util.find_spec('cv2') or importlib.util.find_spec('pyzbar')):
+        print('qr check: skipped (needs opencv-python-headless or pyzbar)')
+        return True
+    token = TokenSigner(b'bench').sign(backend.record_cert_hash(SAMPLE_DATA), backend.record_name_hash(SAMPLE_DATA),
+                                        issued_at=1_700_000_000)
+    ok = True
+    for label, tok in (('unsigned', None), ('signed', token)):
+        _, png = backend.render_certificate(SAMPLE_DATA, None, tok)
+        text = _decode_qr_text(Image.open(io.BytesIO(png)))
+        decoded = bool(text) and (tok is None or tok in text)
+        ok = ok and decoded
+        print(f"qr check: {label:<9} {'ok' if decoded else 'FAILED'}   {len(text or '')} chars")
+    return ok
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args(argv)
+    measure_startup(max(1, args.rounds))
+    measure_render(max(1, args.rounds))
+    if not check_qr():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
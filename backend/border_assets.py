@@ -0,0 +1,162 @@
+"""Registry of the bundled certificate borders.
+
+The borders shipped with the frontend (``build/borders`` and ``public/borders``)
+are decoded once into raw RGBA files under a cache directory. Each worker
+memory-maps those files read-only and wraps them in PIL images without copying,
+so all workers on a host share one physical copy through the page cache and a
+built-in border is never fetched over HTTP.
+"""
+import mmap
+import os
+import stat
+import tempfile
+import threading
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+from PIL import Image
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SEARCH_DIRS = (
+    os.path.join(_REPO_DIR, 'build', 'borders'),
+    os.path.join(_REPO_DIR, 'public', 'borders'),
+)
+# Per-user, not a shared /tmp path: the files in it are mapped straight into every render
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'certificate-borders')
+_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def _origin(url: str) -> str | None:
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return None
+    return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+
+def ensure_private_dir(path: str) -> None:
+    """Create ``path`` with mode 0700, or check that an existing one is safe to use.
+
+    Raises ``PermissionError`` if it is a symlink, owned by another user, or
+    writable by group or others.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by uid {st.st_uid}, not the current user")
+    if st.st_mode & 0o022:
+        raise PermissionError(f"{path} is writable by other users")
+
+
+class BorderAssetRegistry:
+    """Built-in borders by id (file stem, e.g. ``Border1``), served from mmapped RGBA.
+
+    ``origins`` are the ``scheme://host[:port]`` prefixes whose absolute
+    ``/borders/...`` URLs may be served from the bundle; relative URLs always may.
+    """
+
+    def __init__(self, search_dirs=DEFAULT_SEARCH_DIRS, cache_dir: str = DEFAULT_CACHE_DIR,
+                 origins=()):
+        self.cache_dir = cache_dir
+        self.origins = {o for o in (_origin(url) for url in origins) if o}
+        self._lock = threading.Lock()
+        self._dir_checked = False
+        self._paths: dict[str, str] = {}
+        self._mapped: dict[str, tuple[mmap.mmap, tuple[int, int]]] = {}
+        # Earlier directories win, so a fresh build shadows the public/ sources
+        for directory in search_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in _EXTENSIONS:
+                    self._paths.setdefault(stem, os.path.join(directory, name))
+
+    def ids(self) -> list[str]:
+        return sorted(self._paths)
+
+    def path(self, border_id: str) -> str:
+        return self._paths[border_id]
+
+    def resolve(self, source: str | None) -> str | None:
+        """Map a border URL (``/borders/Border1.png``) to a built-in id.
+
+        The URL must be relative or on one of ``origins``, without a query or
+        fragment, and name a bundled file exactly (extension included).
+        """
+        if not source or source.startswith('data:'):
+            return None
+        parsed = urlparse(source)
+        if parsed.query or parsed.fragment or parsed.params:
+            return None
+        if parsed.scheme or parsed.netloc:
+            if _origin(source) not in self.origins:
+                return None
+        parts = unquote(parsed.path).split('/')
+        if len(parts) < 2 or parts[-2] != 'borders':
+            return None
+        stem = os.path.splitext(parts[-1])[0]
+        path = self._paths.get(stem)
+        if path is None or os.path.basename(path) != parts[-1]:
+            return None
+        return stem
+
+    def _raw_path(self, border_id: str, size: tuple[int, int]) -> str:
+        # Source size and mtime are part of the name, so a changed asset gets a new file
+        st = os.stat(self._paths[border_id])
+        w, h = size
+        return os.path.join(self.cache_dir, f"{border_id}-{w}x{h}-{st.st_mtime_ns}-{st.st_size}.rgba")
+
+    def _check_cache_dir(self) -> None:
+        # Another user able to plant files here could swap the pixels every render maps
+        if not self._dir_checked:
+            ensure_private_dir(self.cache_dir)
+            self._dir_checked = True
+
+    def prepare(self, border_id: str) -> tuple[str, tuple[int, int]]:
+        """Decode a border to its raw RGBA file unless that file already exists."""
+        with Image.open(self._paths[border_id]) as img:
+            size = img.size
+            raw_path = self._raw_path(border_id, size)
+            self._check_cache_dir()
+            if not os.path.exists(raw_path):
+                data = img.convert('RGBA').tobytes()
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.chmod(tmp_path, 0o644)
+                # Atomic rename so concurrently starting workers never map a partial file
+                os.replace(tmp_path, raw_path)
+        return raw_path, size
+
+    def prepare_all(self) -> None:
+        for border_id in self.ids():
+            try:
+                self.prepare(border_id)
+            except Exception as e:
+                print(f"Border asset preparation failed for {border_id}: {e}")
+
+    def _map(self, border_id: str) -> tuple[mmap.mmap, tuple[int, int]]:
+        mapped = self._mapped.get(border_id)
+        if mapped is None:
+            with self._lock:
+                mapped = self._mapped.get(border_id)
+                if mapped is None:
+                    raw_path, size = self.prepare(border_id)
+                    with open(raw_path, 'rb') as f:
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    mapped = self._mapped[border_id] = (mm, size)
+        return mapped
+
+    def image(self, border_id: str) -> Image.Image:
+        """Read-only RGBA image backed by the shared mapping; do not modify it in place."""
+        mm, size = self._map(border_id)
+        # frombuffer with the raw decoder and matching layout references the map directly
+        return Image.frombuffer('RGBA', size, mm, 'raw', 'RGBA', 0, 1)
+
+    def array(self, border_id: str) -> np.ndarray:
+        """Read-only ``(height, width, 4)`` uint8 view of the same mapping."""
+        mm, (w, h) = self._map(border_id)
+        return np.frombuffer(mm, dtype=np.uint8).reshape(h, w, 4)
@@ -0,0 +1,173 @@
+"""Offline bulk certificate generator.
+
+    python backend/bulk_cli.py roster.csv --layout layout.json --out certificates.zip
+    python backend/bulk_cli.py roster.xlsx --out out_dir/ --workers 8
+
+Renders every row with the same pipeline as ``/bulk_generate`` (PNG render and
+stego embedding), spread over all cores. Output goes straight to a directory or a
+ZIP file, and rows are upserted into ``DATABASE_URL`` unless ``--no-db`` is given.
+Rows sharing a cert hash are rendered once (see ``--duplicates``).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+
+try:
+    # When running as a package (python -m backend.bulk_cli)
+    from . import app as backend
+except Exception:
+    # When running as a script from the backend directory (python bulk_cli.py)
+    import app as backend
+
+
+DB_BATCH_SIZE = 500
+
+_worker_layout: dict | None = None
+
+
+def _init_worker(layout: dict | None) -> None:
+    # The layout is sent once per worker instead of with every row
+    global _worker_layout
+    _worker_layout = layout
+
+
+def _render_group(item: tuple[tuple[str, dict, list[int]], str | None]) -> tuple[str, dict, list[int], bytes]:
+    (cert_hash, record, rows), token = item
+    _, png = backend.render_certificate(record, _worker_layout, token)
+    return cert_hash, record, rows, png
+
+
+class _DirWriter:
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, name: str, data: bytes) -> None:
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+
+    def close(self) -> None:
+        pass
+
+
+class _ZipWriter:
+    def __init__(self, path: str):
+        # PNGs are already deflate-compressed; storing them saves a second pass
+        self.zf = zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True)
+
+    def write(self, name: str, data: bytes) -> None:
+        self.zf.writestr(name, data)
+
+    def close(self) -> None:
+        self.zf.close()
+
+
+def _load_layout(path: str | None) -> dict | None:
+    if not path:
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        layout = json.load(f)
+    # Same rule as /bulk_generate: an empty layout means the default layout
+    if not layout or not layout.get('elements'):
+        return None
+    return layout
+
+
+def load_records(roster_path: str) -> list[dict]:
+    df = backend.read_roster(roster_path, roster_path)
+    missing = [col for col in backend.REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return [backend.row_to_record(row) for _, row in df.iterrows()]
+
+
+def run(roster_path: str, out_path: str, layout_path: str | None = None,
+        workers: int | None = None, use_db: bool = True, duplicates: str = 'copy') -> int:
+    layout = _load_layout(layout_path)
+    records = load_records(roster_path)
+    groups = backend.dedupe_records(records)
+    duplicate_rows = len(records) - len(groups)
+    conflicts = backend.conflicting_hashes(groups)
+    workers = workers or os.cpu_count() or 1
+    writer = _ZipWriter(out_path) if out_path.lower().endswith('.zip') else _DirWriter(out_path)
+
+    session = None
+    if use_db:
+        backend.init_db()
+        session = backend.get_session()
+
+    print(f"Rendering {len(groups)} distinct certificates ({duplicate_rows} duplicate rows) "
+          f"with {workers} workers -> {out_path}")
+    started = time.perf_counter()
+    created = 0
+    rendered = 0
+    existing = 0
+    # One DB row per cert hash; with conflicts it keeps the last row's fields
+    db_records = {cert_hash: record for cert_hash, record, _ in groups}
+    try:
+        # Tokens are signed up front in one batch with a shared issue time
+        items = list(zip(groups, backend.sign_records([record for _, record, _ in groups])))
+        chunksize = max(1, min(32, len(items) // (workers * 4) or 1))
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(layout,)) as pool:
+            for cert_hash, record, rows, png in pool.imap(_render_group, items, chunksize=chunksize):
+                for idx in (rows if duplicates == 'copy' else rows[:1]):
+                    writer.write(f"certificate_{idx + 1}.png", png)
+                    created += 1
+                db_record = db_records.pop(cert_hash, None)
+                if session is not None and db_record is not None and backend.upsert_certificate(session, cert_hash, db_record):
+                    existing += 1
+                rendered += 1
+                if session is not None and rendered % DB_BATCH_SIZE == 0:
+                    session.commit()
+                if rendered % 100 == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"  {rendered}/{len(groups)}  {rendered / elapsed:.1f} certs/s")
+        if duplicate_rows or conflicts:
+            writer.write('duplicates.csv', backend.duplicates_csv(groups).encode('utf-8'))
+        if session is not None:
+            session.commit()
+    except Exception:
+        if session is not None:
+            session.rollback()
+        raise
+    finally:
+        writer.close()
+        if session is not None:
+            session.close()
+
+    elapsed = time.perf_counter() - started
+    rate = rendered / elapsed if elapsed > 0 else 0.0
+    print(f"Rendered {rendered} certificates, wrote {created} files in {elapsed:.2f}s ({rate:.1f} certs/s)")
+    if duplicate_rows:
+        print(f"Skipped {duplicate_rows} duplicate renders; see duplicates.csv")
+    if conflicts:
+        print(f"{len(conflicts)} certificates have rows with differing title or description; see duplicates.csv")
+    if existing:
+        print(f"{existing} certificates were already in the database")
+    return created
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('roster', help='.csv or .xlsx roster with the standard columns')
+    parser.add_argument('--layout', help='layout JSON exported from the preview editor')
+    parser.add_argument('--out', required=True, help='output directory, or a path ending in .zip')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--no-db', action='store_true', help='do not upsert rows into DATABASE_URL')
+    parser.add_argument('--duplicates', choices=('copy', 'skip'), default='copy',
+                        help='copy: one file per row (default); skip: one file per distinct certificate')
+    args = parser.parse_args(argv)
+    try:
+        run(args.roster, args.out, args.layout, args.workers, use_db=not args.no_db, duplicates=args.duplicates)
+    except Exception as e:
+        print(f"Bulk generation failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
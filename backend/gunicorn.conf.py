@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+# One process per core for CPU-bound rendering; threads keep /verify and
+# /health served while a worker's render slots are busy.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+# Bulk generation can take a while for large rosters
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+# Let each worker import the app itself so warm-up happens per process
+preload_app = False
+
+
+def on_starting(server):
+    # Runs once in the master before any worker forks: DDL from several workers
+    # at once races, and the bundled borders only need decoding once
+    try:
+        from backend import app as backend
+    except Exception:
+        import app as backend
+
+    backend.init_db()
+    backend.border_assets.prepare_all()
+    # Workers must not share the master's connections
+    backend.get_engine().dispose()
+    os.environ['SKIP_INIT_DB'] = '1'
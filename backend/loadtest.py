@@ -0,0 +1,417 @@
+"""Mixed-workload load test for the backend.
+
+    python backend/loadtest.py [--duration 30] [--concurrency 16]
+        [--mix verify=70,generate_png=20,preview_png=8,bulk_generate=2]
+        [--border-latency 0.5] [--border-jitter 0.2] [--border-fail-rate 0.1]
+        [--border-variants 4] [--border-cache-bust]
+        [--spike-threads 64 --spike-at 10 --spike-duration 5]
+        [--url http://127.0.0.1:5000]
+
+Layouts point at a local stand-in border server with injectable latency and
+failures, so the cost of a slow or failing border URL shows up in render
+latency. Without ``--url`` the app is driven in-process through Flask's test
+client (one client per thread) against a temporary SQLite database; with
+``--url`` requests go to a running server, which must be able to reach
+127.0.0.1 for borders. Before the run a small bulk job seeds the certificates
+that ``/verify`` looks up.
+
+Prints per-route throughput, latency percentiles and outcomes: ``ok`` (2xx/3xx),
+``4xx``, ``shed`` (429/503 from render admission), ``5xx`` and ``exc``
+(exceptions). The error rate counts 5xx and exceptions.
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTES = ('verify', 'generate_png', 'preview_png', 'bulk_generate')
+DEFAULT_MIX = 'verify=70,generate_png=20,preview_png=8,bulk_generate=2'
+
+
+class FakeBorderServer:
+    """Local HTTP server standing in for a remote border image host.
+
+    Every request sleeps ``latency`` (plus up to ``jitter``) seconds and then fails
+    with a 503 with probability ``fail_rate``; otherwise it returns a PNG frame.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, fail_rate: float = 0.0,
+                 size: tuple[int, int] = (1600, 1200)):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._png = self._make_png(size)
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @staticmethod
+    def _make_png(size: tuple[int, int]) -> bytes:
+        img = Image.new('RGBA', size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        for i, color in enumerate(((180, 140, 40, 255), (230, 200, 90, 255))):
+            inset = 20 + i * 25
+            draw.rectangle((inset, inset, size[0] - inset, size[1] - inset), outline=color, width=12)
+        buf = io.BytesIO()
+        img.save(buf, format='PNG')
+        return buf.getvalue()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                delay = server.latency + random.uniform(0, server.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                failed = random.random() < server.fail_rate
+                with server._lock:
+                    server.stats['failed' if failed else 'served'] += 1
+                if failed:
+                    self.send_error(503, 'injected failure')
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(server._png)))
+                self.end_headers()
+                self.wfile.write(server._png)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeBorderServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class InProcessTarget:
+    """Sends requests through a per-thread Flask test client."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._backend.app.test_client()
+        return client
+
+    def get(self, path: str, params: dict) -> int:
+        return self._client().get(path, query_string=params).status_code
+
+    def post_json(self, path: str, body: dict) -> int:
+        return self._client().post(path, json=body).status_code
+
+    def post_roster(self, path: str, csv_bytes: bytes, form: dict) -> int:
+        data = dict(form, file=(io.BytesIO(csv_bytes), 'roster.csv'))
+        return self._client().post(path, data=data, content_type='multipart/form-data').status_code
+
+
+class HttpTarget:
+    """Sends requests to a running server with a per-thread ``requests`` session."""
+
+    def __init__(self, base_url: str, timeout: float = 600.0):
+        import requests
+
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        return session
+
+    def get(self, path: str, params: dict) -> int:
+        return self._session().get(self.base_url + path, params=params, timeout=self.timeout,
+                                   allow_redirects=False).status_code
+
+    def post_json(self, path: str, body: dict) -> int:
+        return self._session().post(self.base_url + path, json=body, timeout=self.timeout).status_code
+
+    def post_roster(self, path: str, csv_bytes: bytes, form: dict) -> int:
+        return self._session().post(self.base_url + path, data=form, timeout=self.timeout,
+                                    files={'file': ('roster.csv', csv_bytes, 'text/csv')}).status_code
+
+
+class Workload:
+    """Builds request payloads and runs one request of a given route."""
+
+    def __init__(self, target, backend, border_urls: list[str], args):
+        self.target = target
+        self.backend = backend
+        self.border_urls = border_urls
+        self.cache_bust = args.border_cache_bust
+        self.bulk_rows = args.bulk_rows
+        self.repeat_ratio = args.repeat_ratio
+        self.verify_miss_ratio = args.verify_miss_ratio
+        self.known_hashes: list[str] = []
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._repeat_pool = [self._record(f"Repeat Recipient {i}") for i in range(8)]
+
+    def _next_id(self) -> int:
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    @staticmethod
+    def _record(name: str) -> dict:
+        return {
+            'Recipient Name': name,
+            'Course Name': 'Load Testing 101',
+            'Certificate Date': '2024-01-01',
+            'Issuing Organization': 'Example Institute',
+            'Certificate Title': 'Certificate of Completion',
+            'Certificate Description': 'For sustained throughput under mixed traffic.',
+        }
+
+    def _layout(self) -> dict:
+        url = random.choice(self.border_urls)
+        if self.cache_bust:
+            # A URL the worker has never seen forces a fetch, like a cold worker would
+            url += f"?r={self._next_id()}"
+        elements = {
+            key: {'position': {'x': 200, 'y': y}, 'style': {'fontSize': size, 'textAlign': 'center'}, 'boxWidth': 400}
+            for key, y, size in (('title', 60, 28), ('intro', 120, 14), ('name', 160, 24), ('paragraph', 220, 12),
+                                 ('course', 330, 14), ('date', 360, 12), ('issuer', 390, 12))
+        }
+        elements['qr'] = {'position': {'x': 640, 'y': 440}, 'size': 120}
+        return {
+            'referenceDimensions': {'width': 800, 'height': 600},
+            'borderImageUrl': url,
+            'borderImageUrlAbsolute': url,
+            'elements': elements,
+        }
+
+    def _roster(self, records: list[dict]) -> bytes:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+        return buf.getvalue().encode('utf-8')
+
+    def seed(self, rows: int) -> int:
+        records = [self._record(f"Seed Recipient {i}") for i in range(rows)]
+        status = self.target.post_roster('/bulk_generate', self._roster(records),
+                                         {'layout': json.dumps(self._layout())})
+        self.known_hashes = [self.backend.record_cert_hash(r) for r in records]
+        return status
+
+    def run(self, route: str) -> int:
+        if route == 'verify':
+            if not self.known_hashes or random.random() < self.verify_miss_ratio:
+                cert_id = f"{self._next_id():064x}"
+            else:
+                cert_id = random.choice(self.known_hashes)
+            return self.target.get('/verify', {'cert_id': cert_id})
+        if route in ('generate_png', 'preview_png'):
+            if random.random() < self.repeat_ratio:
+                record = random.choice(self._repeat_pool)
+            else:
+                record = self._record(f"Recipient {self._next_id()}")
+            return self.target.post_json('/' + route, {'data': record, 'layout': self._layout()})
+        if route == 'bulk_generate':
+            batch = self._next_id()
+            records = [self._record(f"Bulk {batch} Recipient {i}") for i in range(self.bulk_rows)]
+            return self.target.post_roster('/bulk_generate', self._roster(records),
+                                           {'layout': json.dumps(self._layout())})
+        raise ValueError(f"Unknown route: {route}")
+
+
+def _outcome(status: int | None) -> str:
+    if status is None:
+        return 'exc'
+    if status in (429, 503):
+        return 'shed'
+    if status >= 500:
+        return '5xx'
+    if status >= 400:
+        return '4xx'
+    return 'ok'
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.outcomes: dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, route: str, seconds: float, status: int | None) -> None:
+        with self._lock:
+            self.latencies[route].append(seconds)
+            self.outcomes[route][_outcome(status)] += 1
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values) / 100) - 1))
+    return sorted_values[index]
+
+
+def _worker(workload: Workload, recorder: Recorder, routes: list[str], weights: list[float],
+            start_at: float, stop_at: float) -> None:
+    now = time.perf_counter()
+    if start_at > now:
+        time.sleep(start_at - now)
+    while time.perf_counter() < stop_at:
+        route = random.choices(routes, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            status = workload.run(route)
+        except Exception:
+            status = None
+        recorder.record(route, time.perf_counter() - t0, status)
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(','):
+        route, _, weight = part.partition('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"unknown route {route!r} (expected one of {', '.join(ROUTES)})")
+        mix[route] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('mix needs at least one positive weight')
+    return mix
+
+
+def summarize(recorder: Recorder, elapsed: float) -> list[dict]:
+    rows = []
+    for route in ROUTES:
+        samples = sorted(recorder.latencies.get(route, []))
+        if not samples:
+            continue
+        outcomes = recorder.outcomes[route]
+        ms = [s * 1000 for s in samples]
+        rows.append({
+            'route': route,
+            'requests': len(samples),
+            'rps': len(samples) / elapsed,
+            'p50_ms': statistics.median(ms),
+            'p95_ms': _percentile(ms, 95),
+            'p99_ms': _percentile(ms, 99),
+            'max_ms': ms[-1],
+            **{k: outcomes.get(k, 0) for k in ('ok', '4xx', 'shed', '5xx', 'exc')},
+            'error_rate': (outcomes.get('5xx', 0) + outcomes.get('exc', 0)) / len(samples),
+        })
+    return rows
+
+
+def print_report(rows: list[dict], elapsed: float, border: FakeBorderServer) -> None:
+    print(f"\n{elapsed:.1f}s run")
+    print(f"{'route':<14}{'n':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+          f"{'ok':>7}{'4xx':>6}{'shed':>6}{'5xx':>6}{'exc':>6}{'err%':>7}")
+    for r in rows:
+        print(f"{r['route']:<14}{r['requests']:>7}{r['rps']:>9.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['ok']:>7}{r['4xx']:>6}{r['shed']:>6}{r['5xx']:>6}"
+              f"{r['exc']:>6}{r['error_rate'] * 100:>6.1f}%")
+    print(f"border server: {border.stats['served']} served, {border.stats['failed']} failed (injected)")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running server (default: drive the app in-process)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--concurrency', type=int, default=16, help='closed-loop client threads')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"route weights (default {DEFAULT_MIX})")
+    parser.add_argument('--bulk-rows', type=int, default=200, help='rows per /bulk_generate job')
+    parser.add_argument('--seed-rows', type=int, default=50, help='certificates created up front for /verify')
+    parser.add_argument('--repeat-ratio', type=float, default=0.0, help='share of renders reusing a small record pool (cache hits)')
+    parser.add_argument('--verify-miss-ratio', type=float, default=0.1, help='share of /verify lookups for unknown ids')
+    parser.add_argument('--border-latency', type=float, default=0.0, help='seconds the border server waits per request')
+    parser.add_argument('--border-jitter', type=float, default=0.0, help='extra random latency, up to this many seconds')
+    parser.add_argument('--border-fail-rate', type=float, default=0.0, help='probability of a 503 from the border server')
+    parser.add_argument('--border-variants', type=int, default=4, help='distinct border URLs in use')
+    parser.add_argument('--border-cache-bust', action='store_true', help='make every border URL unique so each render fetches')
+    parser.add_argument('--spike-threads', type=int, default=0, help='extra /verify-only threads for a scan spike')
+    parser.add_argument('--spike-at', type=float, default=5.0, help='seconds into the run the spike starts')
+    parser.add_argument('--spike-duration', type=float, default=5.0, help='length of the spike in seconds')
+    parser.add_argument('--json', dest='json_path', help='also write the per-route summary to this file')
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    if not args.url and 'DATABASE_URL' not in os.environ:
+        # Keep the in-process run away from the real certificates.db
+        tmp_dir = tempfile.TemporaryDirectory()
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp_dir.name, 'loadtest.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    import app as backend
+
+    if args.url:
+        target = HttpTarget(args.url)
+    else:
+        backend.create_app()
+        target = InProcessTarget(backend)
+
+    border = FakeBorderServer(args.border_latency, args.border_jitter, args.border_fail_rate).start()
+    try:
+        border_urls = [f"{border.base_url}/assets/border-{i}.png" for i in range(max(1, args.border_variants))]
+        workload = Workload(target, backend, border_urls, args)
+        if args.seed_rows > 0 and args.mix.get('verify'):
+            print(f"Seeding {args.seed_rows} certificates: HTTP {workload.seed(args.seed_rows)}")
+
+        recorder = Recorder()
+        routes = [r for r in args.mix if args.mix[r] > 0]
+        weights = [args.mix[r] for r in routes]
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        threads = [threading.Thread(target=_worker, args=(workload, recorder, routes, weights, started, stop_at))
+                   for _ in range(max(1, args.concurrency))]
+        spike_start = started + args.spike_at
+        spike_stop = min(stop_at, spike_start + args.spike_duration)
+        threads += [threading.Thread(target=_worker, args=(workload, recorder, ['verify'], [1.0], spike_start, spike_stop))
+                    for _ in range(max(0, args.spike_threads))]
+        print(f"Running {args.duration:.0f}s with {args.concurrency} threads"
+              + (f" (+{args.spike_threads} verify threads at {args.spike_at:.0f}s)" if args.spike_threads else '')
+              + ('' if not args.url else f" against {args.url}"))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # In-flight requests may finish after the deadline; divide by the real run time
+        elapsed = time.perf_counter() - started
+
+        rows = summarize(recorder, elapsed)
+        print_report(rows, elapsed, border)
+        if args.json_path:
+            with open(args.json_path, 'w') as f:
+                json.dump({'elapsed': elapsed, 'routes': rows, 'border': dict(border.stats)}, f, indent=2)
+    finally:
+        border.stop()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
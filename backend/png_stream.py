@@ -0,0 +1,61 @@
+import struct
+import zlib
+
+import numpy as np
+
+_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Flush compressed data into an IDAT chunk once this much has accumulated
+_IDAT_CHUNK_BYTES = 256 * 1024
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+class StreamingPNGWriter:
+    """Write an 8-bit RGB PNG to a file object one horizontal strip at a time.
+
+    Only the current strip and the previous row are held in memory, so peak usage
+    does not depend on the image height.
+    """
+
+    def __init__(self, fileobj, width: int, height: int, dpi: float | None = None, compress_level: int = 6):
+        self.fileobj = fileobj
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._prev_row = np.zeros((1, width, 3), dtype=np.uint8)
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+
+        fileobj.write(_SIGNATURE)
+        fileobj.write(_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        if dpi:
+            ppm = int(round(dpi / 0.0254))
+            fileobj.write(_chunk(b'pHYs', struct.pack('>IIB', ppm, ppm, 1)))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """Append a ``(h, width, 3)`` uint8 strip."""
+        if rows.shape[1:] != (self.width, 3):
+            raise ValueError(f"Expected rows of shape (h, {self.width}, 3), got {rows.shape}")
+        if self.rows_written + rows.shape[0] > self.height:
+            raise ValueError("More rows written than declared height")
+        # PNG "Up" filter: each row minus the row above it (mod 256)
+        filtered = rows - np.concatenate([self._prev_row, rows[:-1]], axis=0)
+        lines = np.empty((rows.shape[0], 1 + self.width * 3), dtype=np.uint8)
+        lines[:, 0] = 2
+        lines[:, 1:] = filtered.reshape(rows.shape[0], -1)
+        self._pending += self._compressor.compress(lines.tobytes())
+        self._prev_row = rows[-1:].copy()
+        self.rows_written += rows.shape[0]
+        if len(self._pending) >= _IDAT_CHUNK_BYTES:
+            self.fileobj.write(_chunk(b'IDAT', bytes(self._pending)))
+            self._pending.clear()
+
+    def close(self) -> None:
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} rows, expected {self.height}")
+        self._pending += self._compressor.flush()
+        self.fileobj.write(_chunk(b'IDAT', bytes(self._pending)))
+        self._pending.clear()
+        self.fileobj.write(_chunk(b'IEND', b''))
@@ -0,0 +1,165 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class RenderCache:
+    """Bounded LRU cache of rendered PNG bytes, with an optional disk tier.
+
+    The memory tier is bounded by entry count and total bytes. When ``disk_dir``
+    is set, every entry is also written there, and memory misses are served from
+    disk and promoted back into memory.
+
+    The disk tier may be shared by several processes. ``disk_max_bytes`` bounds
+    the whole directory: each process rescans it (at least every
+    ``disk_rescan_seconds``, and whenever its own view goes over the bound)
+    before evicting the least recently used files by mtime, so the directory can
+    only overshoot by what other processes wrote since the last rescan.
+    """
+
+    def __init__(self, max_items: int = 256, max_bytes: int = 128 * 1024 * 1024,
+                 disk_dir: str | None = None, disk_max_bytes: int = 1024 * 1024 * 1024,
+                 disk_rescan_seconds: float = 10.0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_rescan_seconds = disk_rescan_seconds
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.png")
+
+    def _scan_disk(self) -> list[tuple[str, int]]:
+        # The directory is the source of truth: other processes add and evict files too.
+        # Returns (key, size) oldest first; runs without the lock
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.png'):
+                try:
+                    st = os.stat(os.path.join(self.disk_dir, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        return [(key, size) for _, key, size in sorted(entries)]
+
+    def _set_disk_index(self, entries: list[tuple[str, int]]) -> None:
+        self._disk.clear()
+        self._disk_bytes = 0
+        for key, size in entries:
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _load_disk_index(self) -> None:
+        entries = self._scan_disk()
+        with self._lock:
+            self._set_disk_index(entries)
+            self._scanned_at = time.monotonic()
+
+    def _put_mem(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = value
+        self._mem_bytes += len(value)
+        while len(self._mem) > self.max_items or self._mem_bytes > self.max_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+
+    def _write_disk(self, key: str, value: bytes) -> None:
+        # A unique temp name per writer, then an atomic rename, so workers sharing the
+        # directory never see (or interleave writes into) a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _put_disk(self, key: str, value: bytes) -> None:
+        # File I/O happens outside the lock; it only guards the in-memory index
+        with self._lock:
+            if key in self._disk or len(value) > self.disk_max_bytes:
+                return
+        self._write_disk(key, value)
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(value)
+                self._disk_bytes += len(value)
+            rescan = (self._disk_bytes > self.disk_max_bytes
+                      or time.monotonic() - self._scanned_at >= self.disk_rescan_seconds)
+            if rescan:
+                # Claim the rescan so concurrent writers don't all list the directory
+                self._scanned_at = time.monotonic()
+        if rescan:
+            entries = self._scan_disk()
+            with self._lock:
+                self._set_disk_index(entries)
+        victims = []
+        with self._lock:
+            while self._disk_bytes > self.disk_max_bytes:
+                evicted, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                victims.append(evicted)
+        for evicted in victims:
+            try:
+                os.remove(self._disk_path(evicted))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._mem.get(key)
+            if value is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return value
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    value = f.read()
+            except OSError:
+                value = None
+            if value is not None:
+                try:
+                    # Recency lives in the mtime so every process evicts in the same order
+                    os.utime(self._disk_path(key))
+                except OSError:
+                    pass
+                with self._lock:
+                    self._put_mem(key, value)
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._put_mem(key, value)
+        if self.disk_dir:
+            try:
+                self._put_disk(key, value)
+            except OSError as e:
+                print(f"Render cache disk write failed: {e}")
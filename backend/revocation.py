@@ -0,0 +1,117 @@
+import hashlib
+import math
+import threading
+import time
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over string keys (no deletes)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        new = False
+        for pos in self._positions(key):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not self._bits[byte] & mask:
+                self._bits[byte] |= mask
+                new = True
+        # Re-adding a key (e.g. from an overlapping refresh window) does not use up capacity
+        if new:
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationIndex:
+    """In-process view of the revocation list.
+
+    ``might_be_revoked`` answers from memory; only positives need a DB lookup.
+    New revocations are pulled incrementally (by id) at most every
+    ``refresh_interval`` seconds, and the filter is rebuilt from scratch every
+    ``rebuild_interval`` seconds or when it outgrows its capacity, which also
+    drops entries for certificates that were un-revoked.
+
+    Each incremental pull re-reads the last ``refresh_overlap`` ids as well:
+    sequence ids can commit out of order (PostgreSQL), so a row with a lower id
+    may appear after a higher one has been seen.
+    """
+
+    def __init__(self, load_since, refresh_interval: float = 5.0, rebuild_interval: float = 3600.0,
+                 min_capacity: int = 10_000, refresh_overlap: int = 256):
+        # load_since(last_id) -> list[(id, cert_hash)] with id > last_id, ordered by id
+        self._load_since = load_since
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.min_capacity = min_capacity
+        self.refresh_overlap = refresh_overlap
+        self._lock = threading.Lock()
+        self._bloom: BloomFilter | None = None
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self._stale = False
+
+    def _rebuild(self, now: float) -> None:
+        rows = self._load_since(0)
+        bloom = BloomFilter(max(self.min_capacity, len(rows) * 2))
+        for _, cert_hash in rows:
+            bloom.add(cert_hash)
+        self._bloom = bloom
+        self._last_id = rows[-1][0] if rows else 0
+        self._built_at = self._refreshed_at = now
+        self._stale = False
+
+    def _refresh(self, now: float) -> None:
+        for row_id, cert_hash in self._load_since(max(0, self._last_id - self.refresh_overlap)):
+            self._bloom.add(cert_hash)
+            self._last_id = max(self._last_id, row_id)
+        self._refreshed_at = now
+
+    def refresh(self, force: bool = False) -> None:
+        """Pull new revocations if due. Call this before checking out a DB connection
+        for the request, since loading needs a connection of its own."""
+        now = time.monotonic()
+        if force or self._bloom is None:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            # Another thread is already refreshing; answer from the current filter
+            return
+        try:
+            if (self._bloom is None or self._stale or now - self._built_at >= self.rebuild_interval
+                    or self._bloom.count > self._bloom.capacity):
+                self._rebuild(now)
+            elif force or now - self._refreshed_at >= self.refresh_interval:
+                self._refresh(now)
+        finally:
+            self._lock.release()
+
+    def add(self, cert_hash: str) -> None:
+        # Make a revocation issued by this process visible immediately
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(cert_hash)
+
+    def invalidate(self) -> None:
+        """Rebuild on the next refresh, e.g. after an un-revoke removed a row."""
+        self._stale = True
+
+    def might_be_revoked(self, cert_hash: str, refresh: bool = True) -> bool:
+        if refresh or self._bloom is None:
+            self.refresh()
+        return cert_hash in self._bloom
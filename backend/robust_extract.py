@@ -0,0 +1,236 @@
+"""Multi-strategy recovery of the certificate payload from an uploaded image.
+
+Strategies run cheapest first and stop at the first success or when the time
+budget is spent:
+
+1. ``native``: LSB decode (keyed layout, then raster); palette, alpha and other
+   modes are read as RGB
+2. ``qr``: decode the visible QR code and read ``cert_id`` or the signed token ``t``
+   from its URL, retrying at other scales and binarized for resized images
+
+Every LSB attempt rejects implausible length headers before reading any payload,
+and the deadline is checked between attempts inside each strategy as well.
+"""
+import time
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from PIL import Image
+
+try:
+    # When running as a package (python -m backend.app)
+    from .signed_token import MAX_TOKEN_LENGTH
+    from .stego_lsb import DEFAULT_REDUNDANCY, extract_message_from_image
+except Exception:
+    # When running as a script from the backend directory (python app.py)
+    from signed_token import MAX_TOKEN_LENGTH
+    from stego_lsb import DEFAULT_REDUNDANCY, extract_message_from_image
+
+
+# Name hash (64 hex chars), optionally followed by ".<cert hash>" or ".<signed token>";
+# tokens have a fixed length, so this is the longest payload any certificate can carry
+MAX_PAYLOAD_LENGTH = 64 + 1 + max(64, MAX_TOKEN_LENGTH)
+# QR decoding cost grows with pixel count; codes stay readable well below this
+QR_MAX_SIDE = 1600
+# (scale, binarize) retries after a plain decode fails. Resampling a certificate
+# leaves QR modules too small or too soft for the detectors; upscaling and Otsu
+# thresholding recover most of them.
+QR_RETRIES = ((1, True), (2, False), (2, True), (3, True), (3, False))
+# Upscaled retries are skipped beyond this size; they cost more than they recover
+QR_MAX_UPSCALED_SIDE = 2 * QR_MAX_SIDE
+# When a code is located but not decoded, its crop is retried at these widths
+QR_CROP_SIDES = (300, 400)
+_HEX = set('0123456789abcdef')
+
+
+def _looks_like_payload(message: str) -> bool:
+    head = message[:64].lower()
+    return len(head) == 64 and set(head) <= _HEX and (len(message) == 64 or message[64] == '.')
+
+
+def _expired(deadline: float | None) -> bool:
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def _decode_lsb(img: Image.Image, key: str | None, redundancy: int, deadline: float | None = None) -> str | None:
+    # Keyed layout, then raster order for certificates issued without a key
+    layouts = ([{'key': key, 'redundancy': redundancy}] if key else []) + [{}]
+    for kwargs in layouts:
+        if _expired(deadline):
+            return None
+        try:
+            message = extract_message_from_image(img, max_length=MAX_PAYLOAD_LENGTH, **kwargs)
+        except Exception:
+            continue
+        if _looks_like_payload(message):
+            return message
+    return None
+
+
+def _qr_decoders() -> list:
+    """Installed decoders, each ``fn(gray) -> (text or None, corner points or None)``."""
+    decoders = []
+    try:
+        import cv2  # type: ignore
+
+        def decode_cv2(gray: np.ndarray):
+            text, points, _ = cv2.QRCodeDetector().detectAndDecode(gray)
+            return text or None, points
+        decoders.append(decode_cv2)
+    except ImportError:
+        pass
+    try:
+        from pyzbar.pyzbar import decode  # type: ignore
+
+        def decode_pyzbar(gray: np.ndarray):
+            for symbol in decode(Image.fromarray(gray)):
+                return symbol.data.decode('utf-8', errors='replace'), None
+            return None, None
+        decoders.append(decode_pyzbar)
+    except ImportError:
+        pass
+    return decoders
+
+
+def _binarize(gray: np.ndarray) -> np.ndarray:
+    # Otsu's threshold: maximize the between-class variance of the histogram
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    w0 = np.cumsum(hist)
+    w1 = w0[-1] - w0
+    m0 = np.cumsum(hist * np.arange(256))
+    mu0 = m0 / np.maximum(w0, 1)
+    mu1 = (m0[-1] - m0) / np.maximum(w1, 1)
+    threshold = int(np.argmax(w0 * w1 * (mu0 - mu1) ** 2))
+    return np.where(gray > threshold, 255, 0).astype(np.uint8)
+
+
+def _resize(gray: np.ndarray, scale: float) -> np.ndarray:
+    if scale == 1:
+        return gray
+    h, w = gray.shape
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return np.asarray(Image.fromarray(gray).resize(size, Image.BICUBIC))
+
+
+def _crop_retries(gray: np.ndarray, points: np.ndarray, decoders: list, deadline: float | None) -> str | None:
+    # The code was located but not read: decode an enlarged crop around it
+    xs, ys = points.reshape(-1, 2)[:, 0], points.reshape(-1, 2)[:, 1]
+    margin = 0.15 * max(xs.max() - xs.min(), ys.max() - ys.min())
+    x0, y0 = max(0, int(xs.min() - margin)), max(0, int(ys.min() - margin))
+    crop = gray[y0:int(ys.max() + margin) + 1, x0:int(xs.max() + margin) + 1]
+    if crop.size == 0:
+        return None
+    for side in QR_CROP_SIDES:
+        for binarize in (False, True):
+            if _expired(deadline):
+                return None
+            candidate = _resize(crop, side / crop.shape[1])
+            if binarize:
+                candidate = _binarize(candidate)
+            for decode in decoders:
+                text, _ = decode(candidate)
+                if text:
+                    return text
+    return None
+
+
+def _decode_qr_text(img: Image.Image, deadline: float | None = None) -> str | None:
+    """Decode the first QR code with OpenCV and/or pyzbar, whichever is installed.
+
+    A plain decode is tried first, then the :data:`QR_RETRIES` variants, until one
+    succeeds or ``deadline`` (a ``time.perf_counter()`` value) passes.
+    """
+    decoders = _qr_decoders()
+    if not decoders:
+        return None
+    img = img.convert('L')
+    if max(img.size) > QR_MAX_SIDE:
+        img.thumbnail((QR_MAX_SIDE, QR_MAX_SIDE))
+    gray = np.asarray(img)
+    cropped = False
+    for scale, binarize in ((1, False),) + QR_RETRIES:
+        if _expired(deadline):
+            return None
+        if scale > 1 and max(gray.shape) * scale > QR_MAX_UPSCALED_SIDE:
+            continue
+        candidate = _resize(gray, scale)
+        if binarize:
+            candidate = _binarize(candidate)
+        for decode in decoders:
+            text, points = decode(candidate)
+            if text:
+                return text
+            if points is not None and not cropped:
+                cropped = True
+                text = _crop_retries(candidate, points, decoders, deadline)
+                if text:
+                    return text
+    return None
+
+
+def _parse_verify_url(text: str) -> tuple[str | None, str | None]:
+    query = parse_qs(urlparse(text).query)
+    cert_id = (query.get('cert_id') or [None])[0]
+    token = (query.get('t') or [None])[0]
+    return cert_id, token
+
+
+def decode_verify_qr(img: Image.Image, deadline: float | None = None) -> tuple[str | None, str | None] | None:
+    """``(cert_id, token)`` from the certificate's QR code, or None if none was read."""
+    text = _decode_qr_text(img, deadline)
+    if not text:
+        return None
+    cert_id, token = _parse_verify_url(text)
+    return (cert_id, token) if cert_id or token else None
+
+
+def extract_certificate_payload(
+    img: Image.Image,
+    key: str | None = None,
+    redundancy: int = DEFAULT_REDUNDANCY,
+    time_budget: float = 2.0,
+) -> dict:
+    """Try each strategy in order; return what was recovered and how.
+
+    The result has ``strategy`` (None if all failed), ``payload`` (stego message),
+    ``cert_id``/``token`` (from the QR code), ``attempts`` and ``budget_exhausted``.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget
+    result = {
+        'strategy': None, 'payload': None, 'cert_id': None, 'token': None,
+        'attempts': [], 'budget_exhausted': False,
+    }
+
+    def native():
+        return _decode_lsb(img, key, redundancy, deadline)
+
+    def qr():
+        return decode_verify_qr(img, deadline)
+
+    for name, strategy in (('native', native), ('qr', qr)):
+        if _expired(deadline):
+            result['budget_exhausted'] = True
+            break
+        t0 = time.perf_counter()
+        try:
+            found = strategy()
+            error = None
+        except Exception as e:
+            found, error = None, str(e)
+        attempt = {'strategy': name, 'ok': bool(found), 'ms': round((time.perf_counter() - t0) * 1000, 2)}
+        if error:
+            attempt['error'] = error
+        result['attempts'].append(attempt)
+        if not found:
+            continue
+        result['strategy'] = name
+        if name == 'qr':
+            result['cert_id'], result['token'] = found
+        else:
+            result['payload'] = found
+        break
+    if result['strategy'] is None and _expired(deadline):
+        # Also covers a strategy that gave up mid-way at the deadline
+        result['budget_exhausted'] = True
+    return result
@@ -0,0 +1,92 @@
+"""Compact signed certificate tokens for offline verification.
+
+A token is ``2.<payload>.<signature>``. ``payload`` is the base64url encoding of
+the certificate hash (32 bytes), the first 12 bytes of the recipient name hash
+and the issue time (uint32), and ``signature`` is a truncated HMAC-SHA256 over
+``2.<payload>``. The certificate hash already covers all four certificate fields
+and the name hash lets a verifier check the recipient without the database, so
+the token has a fixed length (89 characters) however long the fields are, which
+keeps the QR code small enough to scan at its usual printed size.
+"""
+import base64
+import hashlib
+import hmac
+import struct
+import time
+
+TOKEN_VERSION = '2'
+NAME_HASH_BYTES = 12
+_PAYLOAD = struct.Struct(f'>32s{NAME_HASH_BYTES}sI')
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _b64len(n: int) -> int:
+    return (4 * n + 2) // 3
+
+
+def token_length(signature_bytes: int = 16) -> int:
+    """Length of every token made with ``signature_bytes``-byte signatures."""
+    return len(TOKEN_VERSION) + 1 + _b64len(_PAYLOAD.size) + 1 + _b64len(signature_bytes)
+
+
+# Longest token any signer can produce (untruncated SHA-256 signature)
+MAX_TOKEN_LENGTH = token_length(32)
+
+
+def unverified_cert_hash(token: str) -> str | None:
+    """Certificate hash from a token without checking its signature.
+
+    Only for looking the certificate up (e.g. after the signing key was rotated),
+    never as proof that it was issued.
+    """
+    try:
+        version, payload, _ = token.split('.')
+        if version != TOKEN_VERSION:
+            return None
+        return _PAYLOAD.unpack(_b64decode(payload))[0].hex()
+    except Exception:
+        return None
+
+
+class TokenSigner:
+    def __init__(self, key: bytes, signature_bytes: int = 16):
+        # Keyed HMAC state is computed once; each token only pays for copy() + one block
+        self._base = hmac.new(key, digestmod=hashlib.sha256)
+        self.signature_bytes = signature_bytes
+
+    def _signature(self, signed_part: str) -> bytes:
+        h = self._base.copy()
+        h.update(signed_part.encode('ascii'))
+        return h.digest()[:self.signature_bytes]
+
+    def sign(self, cert_hash: str, name_hash: str, issued_at: int | None = None) -> str:
+        """Sign a certificate; both hashes are hex SHA-256 digests."""
+        issued_at = int(time.time()) if issued_at is None else int(issued_at)
+        raw = _PAYLOAD.pack(bytes.fromhex(cert_hash), bytes.fromhex(name_hash)[:NAME_HASH_BYTES], issued_at)
+        signed_part = f"{TOKEN_VERSION}.{_b64encode(raw)}"
+        return f"{signed_part}.{_b64encode(self._signature(signed_part))}"
+
+    def sign_many(self, items: list[tuple[str, str]], issued_at: int | None = None) -> list[str]:
+        """Sign a batch of ``(cert_hash, name_hash)`` pairs with one shared issue time."""
+        issued_at = int(time.time()) if issued_at is None else int(issued_at)
+        return [self.sign(cert_hash, name_hash, issued_at) for cert_hash, name_hash in items]
+
+    def verify(self, token: str) -> dict | None:
+        """Return ``cert_hash``, ``name_hash`` (hex) and ``issued_at``, or None if the token is invalid."""
+        try:
+            version, payload, signature = token.split('.')
+            if version != TOKEN_VERSION:
+                return None
+            if not hmac.compare_digest(_b64decode(signature), self._signature(f"{version}.{payload}")):
+                return None
+            cert_hash, name_hash, issued_at = _PAYLOAD.unpack(_b64decode(payload))
+            return {'cert_hash': cert_hash.hex(), 'name_hash': name_hash.hex(), 'issued_at': issued_at}
+        except Exception:
+            return None
@@ -1,9 +1,27 @@
+import hashlib
+import itertools
 import struct
+import zlib
 from typing import Tuple
 
+import numpy as np
 from PIL import Image
 
 
+# Keyed mode: positions are drawn from a PRNG seeded by the key in fixed-size
+# blocks so that the first N positions are the same no matter how many are
+# requested (the header can be read before the payload length is known).
+_KEYED_BLOCK = 4096
+# Each bit is stored this many times and read back by majority vote. 15 copies
+# keep a 150x150 px overlay on an 800x600 certificate well below one bit error
+# per payload; the CRC below catches the rest.
+DEFAULT_REDUNDANCY = 15
+# Always set in the keyed length header: a CRC-32 of header + message follows the message
+_CRC_FLAG = 0x80000000
+# On a checksum mismatch, try flipping up to this many of the least certain bits
+_MAX_FLIP_BITS = 10
+
+
 def _bytes_to_bits(data: bytes) -> list[int]:
     bits: list[int] = []
     for byte in data:
@@ -47,8 +65,184 @@ def _set_pixel_rgb(pix, x: int, y: int, rgb: Tuple[int, int, int], alpha):
         pix[x, y] = (rgb[0], rgb[1], rgb[2], alpha)
 
 
-def embed_message(input_png_path: str, output_png_path: str, message: str) -> None:
+def _keyed_rng(key: str, width: int, height: int) -> np.random.Generator:
+    # Bind the permutation to the image geometry as well as the key
+    digest = hashlib.sha256(f"{key}:{width}x{height}".encode("utf-8")).digest()
+    return np.random.Generator(np.random.PCG64(int.from_bytes(digest[:16], "big")))
+
+
+def _keyed_positions(key: str, width: int, height: int, count: int) -> np.ndarray:
+    """Return ``count`` distinct channel positions in ``[0, width*height*3)``.
+
+    Work is proportional to ``count``, not to the image size.
+    """
+    capacity = width * height * 3
+    if count > capacity:
+        raise ValueError(f"Message too large: need {count} bits, capacity is {capacity} bits")
+    rng = _keyed_rng(key, width, height)
+    blocks: list[np.ndarray] = []
+    drawn, target = 0, count
+    while True:
+        # Draw enough blocks for the shortfall, then keep first occurrences in draw order
+        while drawn < target:
+            blocks.append(rng.integers(0, capacity, size=_KEYED_BLOCK, dtype=np.int64))
+            drawn += _KEYED_BLOCK
+        stream = np.concatenate(blocks)
+        _, first = np.unique(stream, return_index=True)
+        if len(first) >= count:
+            return stream[np.sort(first)[:count]]
+        target = drawn + (count - len(first))
+
+
+def _channel_index(positions: np.ndarray, width: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    pixel = positions // 3
+    return pixel // width, pixel % width, positions % 3
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA") if "A" in img.getbands() else img.convert("RGB")
+    return img
+
+
+def _open_rgb_array(input_png_path: str) -> np.ndarray:
+    return np.array(_to_rgb(Image.open(input_png_path)))
+
+
+def _check_declared_length(msg_len: int, capacity_bits: int, bits_per_bit: int, max_length: int | None) -> None:
+    # Reject garbage headers before reading (or walking) any payload bits
+    if max_length is not None and msg_len > max_length:
+        raise ValueError(f"Declared message length {msg_len} exceeds the expected maximum {max_length}")
+    if (32 + msg_len * 8) * bits_per_bit > capacity_bits:
+        raise ValueError("Image does not contain enough data for the declared message length")
+
+
+def _keyed_payload(msg_bytes: bytes) -> bytes:
+    header = struct.pack(">I", len(msg_bytes) | _CRC_FLAG)
+    return header + msg_bytes + struct.pack(">I", zlib.crc32(header + msg_bytes))
+
+
+def _embed_keyed(input_png_path: str, output_png_path: str, payload: bytes, key: str, redundancy: int) -> None:
+    arr = _open_rgb_array(input_png_path)
+    height, width = arr.shape[:2]
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    # Each bit is written ``redundancy`` times, in consecutive position slots
+    bits = np.repeat(bits, redundancy)
+    ys, xs, cs = _channel_index(_keyed_positions(key, width, height, len(bits)), width)
+    arr[ys, xs, cs] = (arr[ys, xs, cs] & 0xFE) | bits
+    Image.fromarray(arr).save(output_png_path, format="PNG")
+
+
+def _keyed_votes(arr: np.ndarray, positions: np.ndarray, redundancy: int) -> np.ndarray:
+    ys, xs, cs = _channel_index(positions, arr.shape[1])
+    return (arr[ys, xs, cs] & 1).reshape(-1, redundancy).sum(axis=1)
+
+
+def _majority(votes: np.ndarray, redundancy: int) -> np.ndarray:
+    # Ties resolve to 1
+    return (votes * 2 >= redundancy).astype(np.uint8)
+
+
+def _correct_with_crc(header: bytes, bits: np.ndarray, votes: np.ndarray, redundancy: int) -> bytes | None:
+    """Return the message if the CRC matches, flipping the least certain bits if needed."""
+    msg_bytes = np.packbits(bits[:-32]).tobytes()
+    expected = int.from_bytes(np.packbits(bits[-32:]).tobytes(), "big")
+    if zlib.crc32(header + msg_bytes) == expected:
+        return msg_bytes
+    # Bits whose vote was closest to a tie are the likeliest to be wrong
+    margin = np.abs(votes * 2 - redundancy)
+    suspects = np.argsort(margin, kind="stable")[:_MAX_FLIP_BITS]
+    suspects = [int(i) for i in suspects if margin[i] < redundancy]
+    for n in range(1, len(suspects) + 1):
+        for combo in itertools.combinations(suspects, n):
+            trial = bits.copy()
+            trial[list(combo)] ^= 1
+            msg_bytes = np.packbits(trial[:-32]).tobytes()
+            if zlib.crc32(header + msg_bytes) == int.from_bytes(np.packbits(trial[-32:]).tobytes(), "big"):
+                return msg_bytes
+    return None
+
+
+def _extract_keyed(img: Image.Image, key: str, redundancy: int, max_length: int | None) -> str:
+    arr = np.array(_to_rgb(img))
+    height, width = arr.shape[:2]
+    header_slots = 32 * redundancy
+    header_pos = _keyed_positions(key, width, height, header_slots)
+    header = np.packbits(_majority(_keyed_votes(arr, header_pos, redundancy), redundancy)).tobytes()
+    (word,) = struct.unpack(">I", header)
+    if not word & _CRC_FLAG:
+        # Damaged header (or no keyed payload at all); never return unchecked bits
+        raise ValueError("Keyed payload header has no checksum flag")
+    msg_len = word & ~_CRC_FLAG
+    _check_declared_length(msg_len, width * height * 3 - 32 * redundancy, redundancy, max_length)
+    total_slots = (32 + msg_len * 8 + 32) * redundancy
+    positions = _keyed_positions(key, width, height, total_slots)
+    votes = _keyed_votes(arr, positions[header_slots:], redundancy)
+    bits = _majority(votes, redundancy)
+    msg_bytes = _correct_with_crc(header, bits, votes, redundancy)
+    if msg_bytes is None:
+        raise ValueError("Embedded payload failed its checksum")
+    return msg_bytes.decode("ascii")
+
+
+def plan_embedding(
+    message: str,
+    width: int,
+    height: int,
+    key: str | None = None,
+    redundancy: int = DEFAULT_REDUNDANCY,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(positions, bits)`` that :func:`embed_message` would write.
+
+    Positions index the flattened ``height x width x 3`` RGB channel array. This
+    lets callers that produce an image in strips apply the payload as they go
+    instead of holding the whole image in memory.
+    """
     msg_bytes = message.encode("ascii")
+    if key:
+        if redundancy < 1:
+            raise ValueError("redundancy must be at least 1")
+        bits = np.repeat(np.unpackbits(np.frombuffer(_keyed_payload(msg_bytes), dtype=np.uint8)), redundancy)
+        return _keyed_positions(key, width, height, len(bits)), bits
+    payload = struct.pack(">I", len(msg_bytes)) + msg_bytes
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    capacity = width * height * 3
+    if len(bits) > capacity:
+        raise ValueError(f"Message too large: need {len(bits)} bits, capacity is {capacity} bits")
+    return np.arange(len(bits), dtype=np.int64), bits
+
+
+def apply_embedding_to_rows(rows: np.ndarray, row_start: int, positions: np.ndarray, bits: np.ndarray) -> None:
+    """Write the planned bits that fall inside ``rows`` (an RGB strip starting at ``row_start``) in place."""
+    strip_h, width = rows.shape[:2]
+    first = row_start * width * 3
+    inside = (positions >= first) & (positions < first + strip_h * width * 3)
+    if not inside.any():
+        return
+    ys, xs, cs = _channel_index(positions[inside] - first, width)
+    rows[ys, xs, cs] = (rows[ys, xs, cs] & 0xFE) | bits[inside]
+
+
+def embed_message(
+    input_png_path: str,
+    output_png_path: str,
+    message: str,
+    key: str | None = None,
+    redundancy: int = DEFAULT_REDUNDANCY,
+) -> None:
+    """Embed ``message`` into the LSBs of the image.
+
+    Without ``key`` the payload is written in raster order starting at the top-left
+    pixel. With ``key`` the bits are scattered over the image by a keyed PRNG, each
+    bit is stored ``redundancy`` times so that local damage can be outvoted, and a
+    CRC-32 lets extraction detect (and repair a few) remaining bit errors.
+    """
+    msg_bytes = message.encode("ascii")
+    if key:
+        if redundancy < 1:
+            raise ValueError("redundancy must be at least 1")
+        _embed_keyed(input_png_path, output_png_path, _keyed_payload(msg_bytes), key, redundancy)
+        return
     header = struct.pack(">I", len(msg_bytes))
     payload = header + msg_bytes
     bit_stream = _bytes_to_bits(payload)
@@ -94,11 +288,27 @@ def embed_message(input_png_path: str, output_png_path: str, message: str) -> No
     img.save(output_png_path, format="PNG")
 
 
-def extract_message(input_png_path: str) -> str:
-    img = Image.open(input_png_path)
-    if img.mode not in ("RGB", "RGBA"):
-        img = img.convert("RGBA") if "A" in img.getbands() else img.convert("RGB")
+def extract_message(input_png_path: str, key: str | None = None, redundancy: int = DEFAULT_REDUNDANCY) -> str:
+    """Extract a message written by :func:`embed_message` with the same ``key``/``redundancy``."""
+    return extract_message_from_image(Image.open(input_png_path), key=key, redundancy=redundancy)
+
+
+def extract_message_from_image(
+    img: Image.Image,
+    key: str | None = None,
+    redundancy: int = DEFAULT_REDUNDANCY,
+    max_length: int | None = None,
+) -> str:
+    """Like :func:`extract_message` for an already opened image.
+
+    ``max_length`` rejects a header declaring a longer message before any payload is read.
+    """
+    if key:
+        if redundancy < 1:
+            raise ValueError("redundancy must be at least 1")
+        return _extract_keyed(img, key, redundancy, max_length)
 
+    img = _to_rgb(img)
     pixels = img.load()
     width, height = img.size
 
@@ -124,6 +334,7 @@ def extract_message(input_png_path: str) -> str:
 
     header_bytes = _bits_to_bytes(header_bits[:32])
     (msg_len,) = struct.unpack(">I", header_bytes)
+    _check_declared_length(msg_len, width * height * 3, 1, max_length)
     total_bits_needed = (32 + msg_len * 8)
 
     # Now read full payload bits
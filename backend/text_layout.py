@@ -0,0 +1,147 @@
+"""Text measurement and line breaking shared by the PNG and PDF renderers.
+
+Both renderers take their lines and font size from :func:`layout_text`, which
+measures with the PIL font used for PNG output at the layout's reference size.
+Line breaks are therefore the same in PNG (at any scale) and PDF output even
+though the PDF is drawn in Helvetica.
+
+Widths are sums of cached per-glyph advances (no kerning), so measuring a string
+is linear in its length, and wrapping measures every word exactly once.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+from PIL import ImageFont
+
+# CSS "normal" line height is roughly 1.2em for the fonts we fall back to
+LINE_HEIGHT = 1.2
+# Shrink-to-fit never goes below this fraction of the requested size (or 8 px)
+MIN_SIZE_RATIO = 0.5
+
+
+@lru_cache(maxsize=64)
+def load_font(bold: bool, size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    # Try common fonts; fall back to Pillow's built-in font
+    candidates = [
+        ("arialbd.ttf" if bold else "arial.ttf", size),
+        ("DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf", size),
+    ]
+    for name, sz in candidates:
+        try:
+            return ImageFont.truetype(name, sz)
+        except Exception:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+class GlyphAdvances:
+    """Advance widths of one font at one size, filled in lazily per character."""
+
+    def __init__(self, font):
+        self._font = font
+        self._advances: dict[str, float] = {}
+
+    def width(self, text: str) -> float:
+        advances = self._advances
+        total = 0.0
+        for ch in text:
+            adv = advances.get(ch)
+            if adv is None:
+                adv = advances[ch] = self._font.getlength(ch)
+            total += adv
+        return total
+
+
+@lru_cache(maxsize=128)
+def glyph_advances(bold: bool, size: int) -> GlyphAdvances:
+    return GlyphAdvances(load_font(bold, size))
+
+
+@dataclass(frozen=True)
+class TextBlock:
+    size: int
+    lines: tuple[str, ...]
+    # Per-line widths at ``size``, in reference pixels
+    widths: tuple[float, ...]
+
+    @property
+    def line_height(self) -> float:
+        return self.size * LINE_HEIGHT
+
+
+def _split_word(word: str, advances: GlyphAdvances, box_width: float) -> list[tuple[str, float]]:
+    # A single word wider than the box is broken between characters
+    pieces, start, width = [], 0, 0.0
+    for i, ch in enumerate(word):
+        w = advances.width(ch)
+        if width + w > box_width and i > start:
+            pieces.append((word[start:i], width))
+            start, width = i, 0.0
+        width += w
+    pieces.append((word[start:], width))
+    return pieces
+
+
+def wrap_text(text: str, bold: bool, size: int, box_width: float) -> TextBlock:
+    """Greedy word wrap of ``text`` into ``box_width``; explicit newlines are kept."""
+    advances = glyph_advances(bold, size)
+    space = advances.width(' ')
+    lines: list[str] = []
+    widths: list[float] = []
+    for paragraph in text.split('\n'):
+        current: list[str] = []
+        current_w = 0.0
+        for word in paragraph.split():
+            word_w = advances.width(word)
+            pieces = [(word, word_w)] if word_w <= box_width else _split_word(word, advances, box_width)
+            for piece, piece_w in pieces:
+                if current and current_w + space + piece_w > box_width:
+                    lines.append(' '.join(current))
+                    widths.append(current_w)
+                    current, current_w = [], 0.0
+                current_w = current_w + space + piece_w if current else piece_w
+                current.append(piece)
+        lines.append(' '.join(current))
+        widths.append(current_w)
+    return TextBlock(size, tuple(lines), tuple(widths))
+
+
+def layout_text(text: str, bold: bool, size: int, box_width: float,
+                max_lines: int | None = 1, min_size: int | None = None) -> TextBlock:
+    """Fit ``text`` into ``box_width`` at the largest size not above ``size``.
+
+    The text is shrunk (down to ``min_size``) until it wraps to at most
+    ``max_lines`` lines; ``max_lines=None`` only wraps. If it does not fit even at
+    ``min_size``, all lines at ``min_size`` are returned.
+    """
+    size = max(1, int(size))
+    if min_size is None:
+        min_size = max(8, round(size * MIN_SIZE_RATIO))
+    min_size = min(size, max(1, int(min_size)))
+
+    block = wrap_text(text, bold, size, box_width)
+    if max_lines is None or len(block.lines) <= max_lines or min_size == size:
+        return block
+    if max_lines == 1:
+        # Widths scale almost linearly with size, so estimate directly and correct downwards
+        widest = max(block.widths)
+        guess = max(min_size, min(size - 1, int(size * box_width / widest))) if widest else size
+        block = wrap_text(text, bold, guess, box_width)
+        while len(block.lines) > 1 and block.size > min_size:
+            block = wrap_text(text, bold, block.size - 1, box_width)
+        return block
+
+    # Largest size in [min_size, size) that needs at most max_lines lines
+    lo, hi, best = min_size, size - 1, None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = wrap_text(text, bold, mid, box_width)
+        if len(candidate.lines) <= max_lines:
+            best, lo = candidate, mid + 1
+        else:
+            hi = mid - 1
+    return best or wrap_text(text, bold, min_size, box_width)
@@ -0,0 +1,14 @@
+"""Production WSGI entry point.
+
+    gunicorn -c backend/gunicorn.conf.py backend.wsgi:app
+
+Each worker process imports this module and gets its own warmed-up app.
+"""
+try:
+    # When running as a package (gunicorn backend.wsgi:app)
+    from .app import create_app
+except Exception:
+    # When running from the backend directory (gunicorn wsgi:app)
+    from app import create_app
+
+app = create_app()